@@ -0,0 +1,96 @@
+"""
+import-time budget for the CLI fast paths
+
+each scenario imports the modules one kind of ttspod invocation needs in a
+fresh interpreter under python -X importtime, then checks that none of the
+heavy libraries it should not touch were imported and that the total import
+time stays within its budget; exits non-zero on any violation
+
+usage:
+    python benchmarks/import_time.py               # check all scenarios
+    python benchmarks/import_time.py --scale 2     # double the time budgets on a slow machine
+    python benchmarks/import_time.py --top 15      # also list the slowest imports
+"""
+# standard modules
+from os import path
+import argparse
+import subprocess
+import sys
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+SOURCE = [path.join(ROOT, 'src', 'ttspod'), path.join(ROOT, 'src', 'ttspod', 'speech')]
+
+# libraries that only synthesis or text extraction need
+EXTRACTION = ['spacy', 'enchant', 'pypandoc', 'html2text', 'trafilatura', 'fitz', 'pymupdf',
+              'magic']
+SYNTHESIS = ['torch', 'torchaudio', 'transformers', 'TTS', 'whisperspeech', 'f5_tts',
+             'openai', 'elevenlabs', 'numpy']
+
+# (name, modules imported, forbidden top-level packages, budget in milliseconds)
+SCENARIOS = [
+    ('version', ['app'], EXTRACTION + SYNTHESIS + ['paramiko', 'pod2gen'], 150),
+    ('sync', ['app', 'main'], EXTRACTION + SYNTHESIS, 500),
+    ('ingest', ['app', 'main', 'content'], ['spacy', 'enchant'] + SYNTHESIS, 1000),
+]
+
+
+def measure(modules):
+    """
+    import modules in a fresh interpreter
+
+    :return: dictionary of module name to cumulative microseconds, with
+             top-level imports under the key None as a list
+    """
+    code = (f'import sys; sys.path[:0] = {SOURCE!r}\n' +
+            '\n'.join(f'import {x}' for x in modules))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f'importing {modules} failed:\n{result.stderr[-2000:]}')
+    timings = {}
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        (_, cumulative, name) = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+        if not name[1:].startswith(' '):
+            top_level.append(int(cumulative))
+    timings[None] = top_level
+    return timings
+
+
+def main():
+    """run the scenarios"""
+    parser = argparse.ArgumentParser(description='check ttspod import-time budgets')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply every time budget by this factor')
+    parser.add_argument('--top', type=int, default=0,
+                        help='list this many slowest imports per scenario')
+    args = parser.parse_args()
+    failures = []
+    for (name, modules, forbidden, budget) in SCENARIOS:
+        try:
+            timings = measure(modules)
+        except RuntimeError as err:
+            failures.append(f'{name}: {err}')
+            continue
+        total = sum(timings.pop(None)) / 1000
+        limit = budget * args.scale
+        heavy = sorted(x for x in timings if x.split('.')[0] in forbidden)
+        print(f'{name:<10}{total:>8.0f} ms  (budget {limit:.0f} ms)')
+        if total > limit:
+            failures.append(f'{name}: imports took {total:.0f} ms, budget {limit:.0f} ms')
+        if heavy:
+            failures.append(f"{name}: imported {', '.join(heavy[:10])}"
+                            f"{' ...' if len(heavy) > 10 else ''}")
+        for (module, cumulative) in sorted(timings.items(), key=lambda x: -x[1])[:args.top]:
+            print(f'    {cumulative / 1000:>8.1f} ms  {module}')
+    if failures:
+        print('\nFAILED:\n' + '\n'.join(failures))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
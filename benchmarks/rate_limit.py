@@ -0,0 +1,154 @@
+"""
+paid-engine request scheduling against a local stub API with quotas
+
+starts an HTTP server on localhost that behaves like a throttling TTS API:
+it admits a limited number of requests per second and in flight, answers
+the rest with 429 and OpenAI-style rate-limit headers, and fails a share of
+requests with 503; RateScheduler then sends a batch of segments to it, and
+for comparison so does a fixed thread pool without retries, as Paid did
+before; exits non-zero if the scheduler loses any segment
+
+usage:
+    python benchmarks/rate_limit.py                       # 60 segments, 5 requests/s, 4 in flight
+    python benchmarks/rate_limit.py --segments 200 --rate 20 --concurrent 8 --errors 0.1
+"""
+# standard modules
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from random import random
+from threading import Lock, Thread
+from time import monotonic, perf_counter, sleep
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import argparse
+import sys
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path[:0] = [path.join(ROOT, 'src', 'ttspod'), path.join(ROOT, 'src', 'ttspod', 'speech')]
+
+# TTSPod modules
+# pylint: disable=wrong-import-position
+from logger import Logger
+from scheduler import RateScheduler
+# pylint: enable=wrong-import-position
+
+
+class Quota(object):
+    """token bucket of requests per second plus a cap on requests in flight"""
+
+    def __init__(self, rate, concurrent, errors, latency):
+        self.rate = rate
+        self.concurrent = concurrent
+        self.errors = errors
+        self.latency = latency
+        self.tokens = float(rate)
+        self.updated = monotonic()
+        self.in_flight = 0
+        self.lock = Lock()
+
+    def admit(self):
+        """(admitted, seconds until a request would be admitted)"""
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1 or self.in_flight >= self.concurrent:
+                return (False, max((1 - self.tokens) / self.rate, 0.05))
+            self.tokens -= 1
+            self.in_flight += 1
+            return (True, 0.0)
+
+    def done(self):
+        """a request finished"""
+        with self.lock:
+            self.in_flight -= 1
+
+
+def handler(quota):
+    """request handler class bound to quota"""
+    class Handler(BaseHTTPRequestHandler):
+        """stub speech endpoint"""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """answer with audio bytes, a 429 or a 503"""
+            (admitted, wait) = quota.admit()
+            if not admitted:
+                self.send_response(429)
+                self.send_header('retry-after-ms', str(round(wait * 1000)))
+                self.send_header('x-ratelimit-remaining-requests', '0')
+                self.send_header('x-ratelimit-reset-requests', f'{wait:.3f}s')
+                self.end_headers()
+                return
+            try:
+                sleep(quota.latency)
+                if random() < quota.errors:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = b'\0' * 1024
+                self.send_response(200)
+                self.send_header('content-length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                quota.done()
+
+        def log_message(self, *_):
+            pass
+    return Handler
+
+
+def main():
+    """run both clients against the stub"""
+    parser = argparse.ArgumentParser(description='exercise RateScheduler against a stub API')
+    parser.add_argument('--segments', type=int, default=60, help='requests to send')
+    parser.add_argument('--rate', type=float, default=5, help='requests admitted per second')
+    parser.add_argument('--concurrent', type=int, default=4, help='requests admitted at once')
+    parser.add_argument('--errors', type=float, default=0.05, help='share of 503 responses')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per request')
+    parser.add_argument('--workers', type=int, default=10, help='client threads (max_workers)')
+    args = parser.parse_args()
+    quota = Quota(args.rate, args.concurrent, args.errors, args.latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler(quota))
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/speech'
+
+    def request(i):
+        with urlopen(f'{url}?segment={i}', timeout=30) as response:
+            return response.read()
+
+    def naive(i):
+        try:
+            return request(i)
+        except HTTPError:
+            return None
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        lost = sum(x is None for x in executor.map(naive, range(args.segments)))
+    print(f'fixed pool       {perf_counter() - start:>6.1f}s  {lost} of {args.segments} '
+          'segments lost')
+    sleep(1)  # let the bucket refill
+    scheduler = RateScheduler(workers=args.workers, retries=8, log=Logger(debug=False, quiet=True))
+    start = perf_counter()
+    failed = 0
+    try:
+        results = list(scheduler.map(request, range(args.segments)))
+    except HTTPError as err:
+        results = []
+        failed = err.code
+    counts = scheduler.counts
+    print(f'RateScheduler    {perf_counter() - start:>6.1f}s  '
+          f'{args.segments - len(results)} of {args.segments} segments lost, '
+          f"{counts['requests']} requests, {counts['throttled']} throttled, "
+          f"{counts['retried']} retried, concurrency settled at {int(scheduler.limit)}")
+    server.shutdown()
+    if failed or len(results) != args.segments:
+        print('FAILED: the scheduler lost segments')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
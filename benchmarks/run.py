@@ -0,0 +1,173 @@
+"""
+micro-benchmarks for the CPU-bound text pipeline
+
+runs the text-processing functions over the reference corpus in
+benchmarks/corpus, reports throughput (input characters per second) and
+peak Python heap usage for each, and compares both with the results stored
+in benchmarks/baseline.json; any case that is slower or larger than its
+baseline by more than the tolerance is reported and the run exits non-zero,
+as it does when there is no baseline to compare with
+
+usage:
+    python benchmarks/run.py                # compare with the stored baseline
+    python benchmarks/run.py --save         # store the current results as the baseline
+    python benchmarks/run.py --only chunk   # run only cases whose name contains "chunk"
+"""
+# standard modules
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from types import SimpleNamespace
+import argparse
+import json
+import sys
+import tracemalloc
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+CORPUS = path.join(ROOT, 'benchmarks', 'corpus')
+BASELINE = path.join(ROOT, 'benchmarks', 'baseline.json')
+sys.path[:0] = [path.join(ROOT, 'src', 'ttspod'), path.join(ROOT, 'src', 'ttspod', 'speech')]
+
+# TTSPod modules
+# pylint: disable=wrong-import-position
+from logger import Logger
+from util import chunk, clean_html, clean_text
+from content import Content
+from paid import Paid
+from segmenter import agreement
+# pylint: enable=wrong-import-position
+
+
+def read(name):
+    """contents of a corpus file"""
+    with open(path.join(CORPUS, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def cases(working_path):
+    """list of (name, characters of input, callable) to benchmark"""
+    log = Logger(debug=False, quiet=True)
+    settings = SimpleNamespace(attachments=False, attachment_path=working_path,
+                               lua_path=path.join(working_path, ''))
+    with open(path.join(working_path, 'noimage.lua'), 'w', encoding='ascii') as f:
+        f.write('function Image(el)\nreturn {}\n end')
+    content = Content(settings, log=log)
+    essay = read('essay.txt')
+    news = read('news.html')
+    mail = read('newsletter.eml')
+    cleaned = clean_text(essay)
+    paid = {x: Paid(config={'segmenter': x}, log=log) for x in ['spacy', 'rules']}
+    pdf = path.join(CORPUS, 'report.pdf')
+    docx = path.join(CORPUS, 'guide.docx')
+    return [
+        ('clean_text/essay', len(essay), lambda: clean_text(essay)),
+        ('clean_text/news', len(news), lambda: clean_text(news)),
+        ('clean_html/news', len(news), lambda: clean_html(news)),
+        ('chunk/spacy/essay', len(cleaned), lambda: chunk(cleaned, 100, 250)),
+        ('chunk/rules/essay', len(cleaned),
+         lambda: chunk(cleaned, 100, 250, segmenter='rules')),
+        ('segmentize/spacy/essay', len(cleaned), lambda: paid['spacy'].segmentize(cleaned)),
+        ('segmentize/rules/essay', len(cleaned), lambda: paid['rules'].segmentize(cleaned)),
+        ('process_html/news', len(news), lambda: content.process_html(news)),
+        ('process_email/newsletter', len(mail), lambda: content.process_email(mail)),
+        ('get_items/news', len(news), lambda: content.get_items(news)),
+        ('get_items/essay', len(essay), lambda: content.get_items(essay)),
+        ('get_items/newsletter', len(mail), lambda: content.get_items(mail)),
+        ('process_file/pdf', path.getsize(pdf), lambda: content.process_file(pdf)),
+        ('process_file/docx', path.getsize(docx), lambda: content.process_file(docx)),
+    ]
+
+
+def measure(function, repeat):
+    """
+    best wall time over repeat runs and peak traced heap of one further run
+
+    a warm-up call comes first so one-off model loads are not counted
+    """
+    if not function():
+        return None
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (min(times), peak)
+
+
+def compare(name, result, baseline, tolerance):
+    """list of regressions of result against the baseline entry for name"""
+    reference = baseline.get(name)
+    if not reference:
+        return []
+    failures = []
+    if result['chars_per_second'] < reference['chars_per_second'] * (1 - tolerance):
+        failures.append(
+            f"{name}: throughput {result['chars_per_second']:,.0f} chars/s, "
+            f"baseline {reference['chars_per_second']:,.0f}")
+    if result['peak_kib'] > reference['peak_kib'] * (1 + tolerance):
+        failures.append(
+            f"{name}: peak memory {result['peak_kib']:,.0f} KiB, "
+            f"baseline {reference['peak_kib']:,.0f}")
+    return failures
+
+
+def main():
+    """run the benchmarks"""
+    parser = argparse.ArgumentParser(description='benchmark the ttspod text pipeline')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed runs per case (default 5)')
+    parser.add_argument('--tolerance', type=float, default=25,
+                        help='allowed regression in percent (default 25)')
+    parser.add_argument('--only', default='', help='run only cases containing this text')
+    parser.add_argument('--save', action='store_true',
+                        help=f'store results as the baseline in {BASELINE}')
+    args = parser.parse_args()
+    baseline = {}
+    if path.isfile(BASELINE) and not args.save:
+        with open(BASELINE, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    results = {}
+    failures = []
+    print(f"{'case':<28}{'chars/s':>14}{'peak KiB':>12}{'baseline':>14}{'change':>9}")
+    with TemporaryDirectory() as working_path:
+        for (name, size, function) in cases(working_path):
+            if args.only not in name:
+                continue
+            measured = measure(function, max(args.repeat, 1))
+            if not measured:
+                print(f'{name:<28}{"skipped, no output (missing dependency?)":>49}')
+                continue
+            (seconds, peak) = measured
+            results[name] = {'chars_per_second': round(size / max(seconds, 1e-9)),
+                             'peak_kib': round(peak / 1024)}
+            reference = baseline.get(name, {}).get('chars_per_second')
+            (previous, change) = (f'{reference:,}',
+                                  f'{results[name]["chars_per_second"] / reference - 1:+.0%}') \
+                if reference else ('', '')
+            print(f"{name:<28}{results[name]['chars_per_second']:>14,}"
+                  f"{results[name]['peak_kib']:>12,}{previous:>14}{change:>9}")
+            failures.extend(compare(name, results[name], baseline, args.tolerance / 100))
+    if not args.only or 'segment' in args.only:
+        score = agreement(clean_text(read('essay.txt')))
+        print(f"\nrule-based segmenter vs spacy on essay: precision {score['precision']:.3f} "
+              f"recall {score['recall']:.3f} f1 {score['f1']:.3f}")
+    if args.save:
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nbaseline saved to {BASELINE}')
+    elif not baseline:
+        # a check without a baseline cannot catch regressions, so it must not pass
+        print(f'\nFAILED: no baseline found; run with --save to store one in {BASELINE}')
+        return 2
+    if failures:
+        print('\nREGRESSIONS:\n' + '\n'.join(failures))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
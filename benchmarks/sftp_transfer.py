@@ -0,0 +1,203 @@
+"""
+remote_sync uploads over a simulated high-latency link
+
+starts an in-process paramiko SSH server with an SFTP subsystem rooted in a
+temporary directory, behind a relay that delays traffic in each direction by
+half the round-trip time, then publishes a backlog of MP3-sized files to it
+with remote_sync.sync using one SFTP channel and again using several; checks
+that every file arrived intact and exits non-zero otherwise
+
+usage:
+    python benchmarks/sftp_transfer.py                     # 30 files of 2 MB, 80 ms round trip
+    python benchmarks/sftp_transfer.py --files 10 --size 20 --latency 0.2 --channels 8
+"""
+# standard modules
+from os import path
+from queue import Queue
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import monotonic, perf_counter, sleep
+import argparse
+import filecmp
+import os
+import socket
+import sys
+
+import paramiko
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path[:0] = [path.join(ROOT, 'src', 'ttspod')]
+
+# TTSPod modules
+# pylint: disable=wrong-import-position
+from remote_sync import sync
+# pylint: enable=wrong-import-position
+
+PASSWORD = 'benchmark'
+
+
+class Server(paramiko.ServerInterface):
+    """accepts one password and session channels"""
+
+    def check_auth_password(self, username, password):
+        if password == PASSWORD:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+def storage(root):
+    """SFTP server interface class serving the directory root"""
+    class Storage(paramiko.SFTPServerInterface):
+        """minimal SFTP file system on local disk"""
+
+        def real(self, remote_path):
+            """local path for a remote path"""
+            return path.join(root, self.canonicalize(remote_path).lstrip('/'))
+
+        def list_folder(self, path_name):
+            try:
+                folder = self.real(path_name)
+                result = []
+                for name in os.listdir(folder):
+                    attr = paramiko.SFTPAttributes.from_stat(os.stat(path.join(folder, name)))
+                    attr.filename = name
+                    result.append(attr)
+                return result
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+
+        def stat(self, path_name):
+            try:
+                return paramiko.SFTPAttributes.from_stat(os.stat(self.real(path_name)))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+
+        lstat = stat
+
+        def open(self, path_name, flags, attr):
+            try:
+                fd = os.open(self.real(path_name), flags | getattr(os, 'O_BINARY', 0), 0o644)
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            if flags & os.O_WRONLY:
+                mode = 'ab' if flags & os.O_APPEND else 'wb'
+            elif flags & os.O_RDWR:
+                mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+            else:
+                mode = 'rb'
+            handle = paramiko.SFTPHandle(flags)
+            handle.filename = self.real(path_name)
+            handle.readfile = handle.writefile = os.fdopen(fd, mode)
+            return handle
+
+        def mkdir(self, path_name, attr):
+            try:
+                os.mkdir(self.real(path_name))
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            return paramiko.SFTP_OK
+
+        def chattr(self, path_name, attr):
+            try:
+                paramiko.SFTPServer.set_file_attr(self.real(path_name), attr)
+            except OSError as err:
+                return paramiko.SFTPServer.convert_errno(err.errno)
+            return paramiko.SFTP_OK
+    return Storage
+
+
+def relay(source, destination, delay):
+    """forward bytes from source to destination, each delayed by delay seconds"""
+    queue = Queue()
+
+    def receive():
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b''
+            queue.put((monotonic() + delay, data))
+            if not data:
+                return
+
+    def send():
+        while True:
+            (due, data) = queue.get()
+            sleep(max(due - monotonic(), 0))
+            try:
+                if not data:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                destination.sendall(data)
+            except OSError:
+                return
+    Thread(target=receive, daemon=True).start()
+    Thread(target=send, daemon=True).start()
+
+
+def serve(listener, root, key, latency):
+    """accept connections on listener and serve each through a delaying relay"""
+    while True:
+        try:
+            (client, _) = listener.accept()
+        except OSError:
+            return
+        (outer, inner) = socket.socketpair()
+        relay(client, outer, latency / 2)
+        relay(outer, client, latency / 2)
+        transport = paramiko.Transport(inner)
+        transport.add_server_key(key)
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, storage(root))
+        transport.start_server(server=Server())
+
+
+def main():
+    """publish the backlog with one channel and with several"""
+    parser = argparse.ArgumentParser(description='time remote_sync uploads over a slow link')
+    parser.add_argument('--files', type=int, default=30, help='files to upload')
+    parser.add_argument('--size', type=float, default=2, help='megabytes per file')
+    parser.add_argument('--latency', type=float, default=0.08, help='round-trip time in seconds')
+    parser.add_argument('--channels', type=int, default=4, help='SFTP channels to compare with one')
+    args = parser.parse_args()
+    with TemporaryDirectory() as working:
+        source = path.join(working, 'episodes')
+        os.mkdir(source)
+        for i in range(args.files):
+            with open(path.join(source, f'episode-{i:03d}.mp3'), 'wb') as f:
+                f.write(os.urandom(int(args.size * 2**20)))
+        remote = path.join(working, 'server')
+        os.mkdir(remote)
+        listener = socket.create_server(('127.0.0.1', 0))
+        Thread(target=serve, daemon=True, args=(
+            listener, remote, paramiko.RSAKey.generate(2048), args.latency)).start()
+        port = listener.getsockname()[1]
+        failed = False
+        for channels in sorted({1, args.channels}):
+            target = f'sftp-{channels}'
+            start = perf_counter()
+            sync(source=path.join(source, ''), destination=f'benchmark@127.0.0.1:{target}/',
+                 port=port, password=PASSWORD, size_only=True, channels=channels)
+            seconds = perf_counter() - start
+            (_, mismatch, errors) = filecmp.cmpfiles(
+                source, path.join(remote, target), os.listdir(source), shallow=False)
+            print(f'{channels:>2} channel{"s" if channels > 1 else " "}  {seconds:>6.1f}s  '
+                  f'{args.files * args.size / seconds:>6.1f} MB/s  '
+                  f'{len(mismatch) + len(errors)} of {args.files} files wrong or missing')
+            failed = failed or bool(mismatch or errors)
+        listener.close()
+    if failed:
+        print('FAILED: uploaded files differ from the source')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,6 +26,7 @@ except ImportError as e:
 # ttspod modules
 from version import __version__
 from util import get_character, get_lock, release_lock, upgrade
+from server import Server, submit
 
 
 class App(object):
@@ -44,6 +45,8 @@ class App(object):
         self.main = None
         self.model = None
         self.quiet = None
+        self.serve = None
+        self.stats = None
         self.title = None
         self.gpu = None
         self.upgrade = False
@@ -102,12 +105,19 @@ class App(object):
                             "(for use with Coqui, OpenAI, or Eleven)")
         parser.add_argument("-s", "--sync", action='store_true',
                             help="sync podcast episodes and state file")
+        parser.add_argument("--serve", action='store_true',
+                            help="run as a resident worker that keeps the TTS engine loaded "
+                            "and processes jobs handed over by other ttspod invocations")
         parser.add_argument("-n", "--dry-run", action='store_true',
                             help="do not actually create or sync audio files")
         parser.add_argument("--nogpu", action='store_true',
                             help="disable GPU support (try this if you're having trouble on Mac)")
         parser.add_argument("-u", "--upgrade", action='store_true',
                             help="upgrade to latest version")
+        parser.add_argument("--stats", action='store_true',
+                            help="report synthesis speed by engine, model, voice and device")
+        parser.add_argument("--days", type=int, default=None,
+                            help="with --stats, only include the last DAYS days")
         parser.add_argument("-v", "--version", action='store_true',
                             help="print version number")
         args = parser.parse_args()
@@ -143,6 +153,10 @@ class App(object):
         self.pocket = args.pocket
         self.insta = args.insta
         self.url = args.url
+        self.serve = args.serve
+        self.stats = args.stats
+        if self.stats:
+            return self.show_stats(args.days)
         if args.upgrade:
             upgrade(force=self.force, debug=self.debug)
             return False
@@ -152,12 +166,29 @@ class App(object):
             args.pocket or
             args.sync or
             self.got_pipe or
-            args.insta
+            args.insta or
+            args.serve
         ):
             parser.print_help()
             return False
         return True
 
+    def show_stats(self, days=None):
+        """print real-time factor history; returns False since there is nothing to run"""
+        # pylint: disable=import-outside-toplevel
+        from config import Config
+        from logger import Logger
+        from stats import Stats
+        # pylint: enable=import-outside-toplevel
+        log = Logger(debug=False, quiet=True)
+        try:
+            config = Config(config_path=self.config_path, log=log, debug=False, quiet=True)
+        except ValueError as err:
+            print(err)
+            return False
+        print(Stats.from_config(config, log=log).report(days))
+        return False
+
     def generate_env_file(self, env_file):
         """generate a new .env file"""
         if not env_file:
@@ -190,6 +221,8 @@ class App(object):
 
     def run(self):
         """primary app loop"""
+        if self.serve:
+            return self.start_worker()
         try:
             if not get_lock():
                 if not self.force:
@@ -199,6 +232,13 @@ class App(object):
                     return False
                 else:
                     release_lock()
+            pipe_input = str(stdin.read()) if self.got_pipe else ''
+            for i in self.url:
+                if not url(i) and not path.isfile(path.expanduser(i)):
+                    print(f'command-line argument {i} not recognized')
+            self.url = [i for i in self.url if url(i) or path.isfile(path.expanduser(i))]
+            if self.delegate(pipe_input):
+                return True
             # this import is slow (loads TTS engines), so only import when needed
             # there is probably a better way to do this by refactoring
             from main import Main  # pylint: disable=import-outside-toplevel
@@ -214,10 +254,8 @@ class App(object):
                 gpu=self.gpu,
                 quiet=self.quiet
             )
-            if self.got_pipe:
-                pipe_input = str(stdin.read())
-                if pipe_input:
-                    self.main.process_content(pipe_input, self.title)
+            if pipe_input:
+                self.main.process_content(pipe_input, self.title)
             if self.wallabag:
                 self.main.process_wallabag(self.wallabag)
             if self.pocket:
@@ -227,10 +265,8 @@ class App(object):
             for i in self.url:
                 if url(i):
                     self.main.process_link(i, self.title)
-                elif path.isfile(path.expanduser(i)):
-                    self.main.process_file(path.expanduser(i), self.title)
                 else:
-                    print(f'command-line argument {i} not recognized')
+                    self.main.process_file(path.expanduser(i), self.title)
             return self.main.finalize()
         # pylint: disable=W0718
         # global exception catcher for application loop
@@ -245,6 +281,71 @@ class App(object):
         finally:
             release_lock()
 
+    def delegate(self, pipe_input=''):
+        """
+        hand this session's work to a running ttspod worker, if there is one
+
+        returns False if the work should be done in this process instead
+
+        :param pipe_input: content read from stdin
+        """
+        if self.dry or self.clean:
+            return False
+        links = []
+        fnames = []
+        for i in self.url:
+            if url(i):
+                links.append(i)
+            else:
+                fnames.append(path.abspath(path.expanduser(i)))
+        # the settings file this session would load, so the worker can
+        # decline work meant for another configuration
+        from config import find_config  # pylint: disable=import-outside-toplevel
+        config_path = find_config(
+            path.expanduser(self.config_path) if self.config_path else None)
+        request = {
+            'config': path.realpath(config_path) if config_path else None,
+            'engine': self.engine,
+            'model': self.model,
+            'force': self.force,
+            'title': self.title,
+            'text': pipe_input,
+            'wallabag': self.wallabag,
+            'pocket': self.pocket,
+            'insta': self.insta,
+            'links': links,
+            'files': fnames
+        }
+        reply = submit(request)
+        if not reply:
+            return False
+        if reply.get('status') == 'declined':
+            if not self.quiet:
+                print(f'ttspod worker declined job ({reply.get("message")}), '
+                      'processing locally')
+            return False
+        if not self.quiet or reply.get('status') != 'ok':
+            print(reply.get('message'))
+        return reply.get('status') == 'ok'
+
+    def start_worker(self):
+        """load the TTS engine once and serve jobs until interrupted"""
+        from main import Main  # pylint: disable=import-outside-toplevel
+        self.main = Main(
+            debug=self.debug,
+            config_path=self.config_path,
+            engine=self.engine,
+            model=self.model,
+            force=self.force,
+            dry=self.dry,
+            clean=self.clean,
+            logfile=self.log,
+            gpu=self.gpu,
+            quiet=self.quiet
+        )
+        Server(main=self.main, log=self.main.log).serve()
+        return True
+
 
 def main():
     """nominal main loop to read arguments and execute app"""
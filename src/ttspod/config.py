@@ -24,9 +24,32 @@ except ImportError as e:
 
 # TTSPod modules
 from logger import Logger
+from registry import select
 from util import fix_path, check_engines
 
-ENGINES = check_engines()
+
+def find_config(config_path=None):
+    """
+    locate the settings file to load
+
+    :param config_path: file or directory given with --config, if any
+    :return: path of the settings file, or None if there is none
+    """
+    if config_path and path.isfile(config_path):
+        return config_path
+    if (config_path and path.isdir(config_path) and
+            path.isfile(path.join(config_path, '.env'))):
+        return path.join(config_path, '.env')
+    for candidate in [
+        path.join(Path.home(), '.config', 'ttspod.ini'),
+        path.join(getcwd(), '.config', 'ttspod.ini'),
+        path.join(getcwd(), '.env'),
+        path.join(path.dirname(getsourcefile(lambda: 0)), '.env'),
+        path.join(path.dirname(path.realpath(__file__)), '.env')
+    ]:
+        if path.isfile(candidate):
+            return candidate
+    return None
 
 
 class Config(object):
@@ -96,13 +119,14 @@ class Config(object):
             self.ssh_server_path = e.get('ttspod_pod_server_path')
             self.ssh_keyfile = ssh_keyfile
             self.ssh_password = ssh_password
+            self.ssh_channels = max(int(e.get('ttspod_ssh_channels', 4)), 1)
             self.final_path = final_path
             self.rss_file = path.join(final_path, 'index.rss')
 
     class Speech(object):
         """tts processor settings"""
 
-        def __init__(self, temp_path='./', final_path='./', engine=None,
+        def __init__(self, temp_path='./', final_path='./', cache_path='./cache/', engine=None,
                      model=None, max_workers=10, log=None, debug=False, gpu=1):
             self.log = log if log else Logger(debug=True)
             self.debug = debug
@@ -134,50 +158,47 @@ class Config(object):
                 self.eleven_model = model
             self.model = self.model.lower()
             if not self.voice or self.voice and not path.exists(self.voice):
-                if self.engine == 'coqui' and self.model == 'xtts':
+                if getattr(select(self.engine, self.model), 'name', None) == 'xtts':
                     self.voice = 'Daisy Studious'
                 else:
                     self.voice = files('ttspod').joinpath('data', 'sample.wav')
             self.language = e.get('ttspod_language')
             self.max_workers = max_workers
+            self.paid_retries = int(e.get('ttspod_paid_retries', 5))
+            self.paid_budget = int(e.get('ttspod_paid_budget', 0))
             self.temp_path = fix_path(temp_path, True)
             self.final_path = fix_path(final_path, True)
+            self.cache_path = fix_path(cache_path, True)
+            self.chunk_cache_path = path.join(self.cache_path, 'chunks', '')
+            self.voice_cache_path = path.join(self.cache_path, 'voices', '')
+            self.tuning_path = path.join(self.cache_path, 'chunk_sizes.json')
+            self.chunk_size = e.get('ttspod_chunk_size', 'auto')
+            self.cache_size = float(e.get('ttspod_cache_size', 1024))
+            self.batch_size = max(int(e.get('ttspod_batch_size', 1)), 1)
+            self.segmenter = e.get('ttspod_segmenter', 'spacy').lower()
+            self.cpu_workers = max(int(e.get('ttspod_cpu_workers', 1)), 1)
+            self.cpu_threads = int(e.get('ttspod_cpu_threads', 0))
             if not self.engine:
                 self.engine = 'coqui'
             # TODO: some more TTS engine validation
+            engines = check_engines()
             self.log.write(
-                f'Available TTS engines are: {ENGINES}.', log_level=3)
+                f'Available TTS engines are: {engines}.', log_level=3)
             self.log.write(
                 f'TTS settings: engine {self.engine} / model {self.model} / voice {self.voice}',
                 log_level=2
             )
-            if not self.engine in ENGINES:
+            backend = select(self.engine, self.model)
+            if not backend or not backend.engine in engines:
                 self.log.write(f'TTS engine {self.engine} selected but not available.\n'
-                               f'Available engines are: {ENGINES}\n'
+                               f'Available engines are: {engines}\n'
                                'reinstall with quickstart.sh to add engines', True)
                 self.engine = ""
 
     def __init__(self, debug=True, engine=None, model=None,
                  config_path=None, log=None, gpu=None, quiet=False):
         self.log = log if log else Logger(debug=debug)
-        self.config_path = None
-        if config_path and path.isfile(config_path):
-            self.config_path = config_path
-        elif (config_path and path.isdir(config_path) and
-              path.isfile(path.join(config_path, '.env'))):
-            self.config_path = path.join(config_path, '.env')
-        elif path.isfile(path.join(Path.home(), '.config', 'ttspod.ini')):
-            self.config_path = path.join(Path.home(), '.config', 'ttspod.ini')
-        elif path.isfile(path.join(getcwd(), '.config', 'ttspod.ini')):
-            self.config_path = path.join(getcwd(), '.config', 'ttspod.ini')
-        elif path.isfile(path.join(getcwd(), '.env')):
-            self.config_path = path.join(getcwd(), '.env')
-        elif path.isfile(path.join(path.dirname(getsourcefile(lambda: 0)), '.env')):
-            self.config_path = path.join(
-                path.dirname(getsourcefile(lambda: 0)), '.env')
-        elif path.isfile(path.join(path.dirname(path.realpath(__file__)), '.env')):
-            self.config_path = path.join(
-                path.dirname(path.realpath(__file__)), '.env')
+        self.config_path = find_config(config_path)
         if self.config_path:
             if not quiet:
                 self.log.write(
@@ -197,6 +218,7 @@ class Config(object):
         self.max_length = int(e.get('ttspod_max_length', 20000))
         self.max_workers = int(e.get('ttspod_max_workers', 10))
         self.max_articles = int(e.get('ttspod_max_articles', 5))
+        self.pipeline_depth = int(e.get('ttspod_pipeline_depth', 2))
         self.working_path = path.join(
             e.get('ttspod_working_path', './working'), '')
         if self.working_path:
@@ -207,6 +229,7 @@ class Config(object):
                 path.dirname(__file__), self.working_path)
         self.temp_path = path.join(self.working_path, 'temp', '')
         self.final_path = path.join(self.working_path, 'output', '')
+        self.cache_path = path.join(self.working_path, 'cache', '')
         self.log_path = e.get('ttspod_log')
         if self.log_path:
             self.log_path = fix_path(self.log_path, False)
@@ -215,6 +238,15 @@ class Config(object):
         if self.log_path:
             self.log.update(debug=self.debug, logfile=self.log_path,
                             maximum_level=self.log_level)
+        self.timing_log = e.get('ttspod_timing_log')
+        if self.timing_log:
+            self.timing_log = fix_path(self.timing_log, False)
+        if self.timing_log and not '/' in self.timing_log and not '\\' in self.timing_log:
+            self.timing_log = path.join(self.working_path, self.timing_log)
+        self.timing_metrics = e.get('ttspod_timing_metrics')
+        if self.timing_metrics:
+            self.timing_metrics = fix_path(self.timing_metrics, False)
+        self.stats_path = path.join(self.working_path, 'stats.jsonl')
         self.pickle_filename = 'ttspod.pickle'
         self.pickle = path.join(self.working_path, self.pickle_filename)
         if e.get('ttspod_state_file_path'):
@@ -225,8 +257,9 @@ class Config(object):
         if self.state_file_path:
             self.state_file_path = fix_path(self.state_file_path, False)
         self.speech = self.Speech(temp_path=self.temp_path, final_path=self.final_path,
-                                  engine=engine, model=model, max_workers=self.max_workers,
-                                  log=self.log, debug=self.debug, gpu=self.gpu)
+                                  cache_path=self.cache_path, engine=engine, model=model,
+                                  max_workers=self.max_workers, log=self.log,
+                                  debug=self.debug, gpu=self.gpu)
         self.content = self.Content(
             working_path=self.working_path, log=self.log)
         self.links = self.Links(log=self.log)
@@ -281,6 +314,7 @@ class Config(object):
         Path(self.working_path).mkdir(parents=True, exist_ok=True)
         Path(self.temp_path).mkdir(parents=True, exist_ok=True)
         Path(self.final_path).mkdir(parents=True, exist_ok=True)
+        Path(self.cache_path).mkdir(parents=True, exist_ok=True)
         chmod(self.final_path, 0o755)
         if not path.isfile(path.join(self.working_path, 'no_image.lua')):
             with open(path.join(self.working_path, 'no_image.lua'), 'w', encoding='ascii') as f:
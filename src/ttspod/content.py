@@ -12,6 +12,7 @@ try:
     from html import unescape
     from lxml import html
     from os import path
+    from time import perf_counter
     from uuid import uuid4
     import email
     import hashlib
@@ -28,6 +29,7 @@ except ImportError as e:
 
 # tts modules
 from logger import Logger
+from timing import TIMER, span
 from util import clean_html, clean_text
 
 # optional modules
@@ -56,6 +58,7 @@ class Content(object):
 
     def process_email(self, text=None, title=None):
         """email input processor"""
+        start = perf_counter()
         if isinstance(text, str):  # check if input is text or unicode
             msg = email.message_from_string(text)
         else:
@@ -136,6 +139,7 @@ class Content(object):
             text = longest_plain_part
         else:
             text = ''
+        TIMER.record('extract', perf_counter() - start, kind='email')
         text = clean_text(text)
         if text:
             entry = (title, text, url)
@@ -172,22 +176,23 @@ class Content(object):
         self.log.write(f'found item with title {title}')
         # do our best with Trafilatura; if that fails, try pandoc
         # pylint: disable=broad-exception-caught
-        if AVAILABLE_TRAFILATURA:
-            try:
-                my_tree = html.fromstring(raw_html)
-                text = trafilatura.extract(
-                    my_tree, include_comments=False).replace('\n', '\n\n')
-                title_search = trafilatura.extract_metadata(my_tree).title
-                if title_search and not title:
-                    title = unescape(title_search)
-            except Exception:
-                pass
-        if not text:
-            self.log.write('attempting pandoc extraction')
-            try:
-                text = clean_html(raw_html)
-            except Exception:
-                pass
+        with span('extract', kind='html'):
+            if AVAILABLE_TRAFILATURA:
+                try:
+                    my_tree = html.fromstring(raw_html)
+                    text = trafilatura.extract(
+                        my_tree, include_comments=False).replace('\n', '\n\n')
+                    title_search = trafilatura.extract_metadata(my_tree).title
+                    if title_search and not title:
+                        title = unescape(title_search)
+                except Exception:
+                    pass
+            if not text:
+                self.log.write('attempting pandoc extraction')
+                try:
+                    text = clean_html(raw_html)
+                except Exception:
+                    pass
         # pylint: enable=broad-exception-caught
         text = clean_text(text)
         if text:
@@ -222,6 +227,7 @@ class Content(object):
             return self.process_email(c, title)
         title = title if title else fname
         text = ""
+        start = perf_counter()
         if "pdf" in buffer_type and AVAILABLE_FITZ:
             doc = pymupdf.Document(stream=c)
             for page in doc:
@@ -252,6 +258,7 @@ class Content(object):
                                                  ])
                 except Exception:  # pylint: disable=broad-except
                     text = ""
+        TIMER.record('extract', perf_counter() - start, kind='file')
         self.log.write(f'process_file got cleaned text: {text}')
         if text:
             items = self.get_items(text=text, title=title)
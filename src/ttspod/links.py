@@ -21,6 +21,7 @@ except ImportError as e:
 
 # TTSPod modules
 from logger import Logger
+from timing import span
 from util import clean_text
 
 
@@ -43,16 +44,18 @@ class Links(object):
             return None
         self.log.write(f"Processing {url}.")
         try:
-            downloaded = trafilatura.fetch_url(url, config=self.my_config)
-            text = trafilatura.extract(
-                downloaded, include_comments=False, output_format="txt"
-            )
-            if text:
-                text = text.replace("\n", "\n\n")
-                if not title:
+            with span('fetch', source='link'):
+                downloaded = trafilatura.fetch_url(url, config=self.my_config)
+            with span('extract', kind='html'):
+                text = trafilatura.extract(
+                    downloaded, include_comments=False, output_format="txt"
+                )
+                if text and not title:
                     detect_title = trafilatura.extract_metadata(
                         downloaded).title
                     title = detect_title if detect_title else url
+            if text:
+                text = text.replace("\n", "\n\n")
                 text = clean_text(text)
                 entry = (title, text, url)
                 entries.append(entry)
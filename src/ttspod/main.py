@@ -8,8 +8,11 @@ except ImportError:
 
 # standard modules
 try:
+    from itertools import islice
     from os import path
+    from queue import Queue
     from shutil import move
+    from threading import Thread
     import datetime
     import pickle
 except ImportError as e:
@@ -21,16 +24,17 @@ except ImportError as e:
 
 # TTSPod modules
 from config import Config
-from content import Content
-from links import Links
 from logger import Logger
 from pod import Pod
 from remote_sync import sync as rsync
 # TODO: use native rsync on platforms where it is available
 from speech.speech import Speech
-from ttsinsta import TTSInsta
-from ttspocket import TTSPocket
-from wallabag import Wallabag
+from stats import Stats
+from timing import TIMER, span
+# input modules pull in extraction libraries (trafilatura, pypandoc, lxml,
+# pymupdf) and are imported by the process_* method that needs them, so
+# sync-only runs stay light
+# pylint: disable=import-outside-toplevel
 
 
 class Main(object):
@@ -40,20 +44,25 @@ class Main(object):
                  model=None, force=False, dry=False, clean=False,
                  logfile=None, quiet=False, gpu=None):
         self.log = Logger(debug=debug, logfile=logfile, quiet=quiet)
-        self.config = Config(
-            engine=engine,
-            model=model,
-            config_path=config_path,
-            log=self.log,
-            gpu=gpu,
-            quiet=quiet,
-            debug=debug
-        )
+        with span('config'):
+            self.config = Config(
+                engine=engine,
+                model=model,
+                config_path=config_path,
+                log=self.log,
+                gpu=gpu,
+                quiet=quiet,
+                debug=debug
+            )
+        TIMER.configure(span_log=self.config.timing_log,
+                        metrics_file=self.config.timing_metrics, log=self.log)
         self.p = None
         self.force = force
         self.dry = dry
         self.cache = []
+        self.found = 0
         self.speech = None  # defer spinning up TTS until necessary
+        self.stats = Stats.from_config(self.config, log=self.log)
         self.load_cache(clean=clean)
         self.pod = Pod(config=self.config.pod, p=self.p, log=self.log)
         self.pod.config.debug = self.config.debug
@@ -64,14 +73,15 @@ class Main(object):
         """load podcast and cache from pickle if available"""
         if self.config.state_file_path:
             try:
-                rsync(
-                    source=self.config.state_file_path,
-                    destination=self.config.pickle,
-                    debug=self.config.debug,
-                    keyfile=self.config.ssh_keyfile,
-                    password=self.config.ssh_password,
-                    recursive=False
-                )
+                with span('state_sync', direction='download'):
+                    rsync(
+                        source=self.config.state_file_path,
+                        destination=self.config.pickle,
+                        debug=self.config.debug,
+                        keyfile=self.config.ssh_keyfile,
+                        password=self.config.ssh_password,
+                        recursive=False
+                    )
                 self.log.write('state file synced successfully from server')
             except Exception as err:  # pylint: disable=broad-except
                 self.log.write(
@@ -95,44 +105,96 @@ class Main(object):
                     f"failed to open saved data file {f}: {err}") from err
         return True
 
+    def refresh(self):
+        """reload cache and podcast state, e.g. before each job of a long-running worker"""
+        self.load_cache()
+        if self.p:
+            self.pod.p = self.p
+        return True
+
+    def load_speech(self):
+        """spin up the TTS engine if it is not already loaded"""
+        if not self.speech:
+            self.speech = Speech(config=self.config.speech,
+                                 dry=self.dry, log=self.log)
+        return self.speech
+
     def process(self, items):
-        """feed items retrieved by input modules to TTS output modules"""
+        """
+        feed items retrieved by input modules to TTS output modules
+
+        items may be a list or a lazy iterable (e.g. a generator that fetches
+        each link on demand); ingest runs in a background thread that fills a
+        bounded queue, so fetching and extraction of the next items overlap
+        with synthesis of the current one
+        """
         if not items:
             self.log.write('no items found to process')
             return False
-        if not self.speech:
-            self.speech = Speech(config=self.config.speech,
-                                 dry=self.dry, log=self.log)
-        for item in items[0:self.config.max_articles]:
+        queue = Queue(maxsize=max(self.config.pipeline_depth, 1))
+        self.found = 0  # items the source returned, counted by ingest
+        ingest = Thread(target=self.ingest, args=(items, queue), daemon=True)
+        ingest.start()
+        while (item := queue.get()) is not None:
             (title, content, url) = item
-            if url in self.cache and not self.force:
-                self.log.write(
-                    f'Skipping "{title}" because it is already in the feed. '
-                    'Use --force to regenerate previously processed content.',
-                    log_level=1
-                )
-                continue
-            if len(content) > self.config.max_length:
-                self.log.write(
-                    f'Skipping "{title}" because it is longer than '
-                    f'max length of {self.config.max_length}.',
-                    log_level=0
-                )
-                continue
             self.log.write(f'Processing {title}')
             if self.dry:
                 self.log.write(
                     'Dry run, skipping audio generation.', log_level=3)
                 continue
+            self.load_speech()
+            mark = TIMER.mark()
             fullpath = self.speech.speechify(title, content)
+            # chunk tuning renders a reference passage that is not part of the item
+            spans = [x for x in TIMER.since(mark, 'synthesis') if x.get('parent') != 'autotune']
+            self.stats.add(self.speech.profile(), spans, title)
             if fullpath:
                 self.pod.add((url, title, fullpath))
                 self.cache.append(url)
             else:
                 self.log.write(
                     f'something went wrong processing {title}', True)
+        ingest.join()
+        # a generator is truthy even when the source turns out to be empty
+        if not self.found:
+            self.log.write('no items found to process')
+            return False
         return True
 
+    def ingest(self, items, queue):
+        """
+        pull items from an input source, filter them and hand them to synthesis
+
+        :param items: list or iterable of (title, content, url) tuples
+        :param queue: bounded queue feeding the synthesis stage, terminated with None
+        """
+        try:
+            for item in islice(items, self.config.max_articles):
+                if not item:
+                    continue
+                self.found += 1
+                (title, content, url) = item
+                if url in self.cache and not self.force:
+                    self.log.write(
+                        f'Skipping "{title}" because it is already in the feed. '
+                        'Use --force to regenerate previously processed content.',
+                        log_level=1
+                    )
+                    continue
+                if len(content) > self.config.max_length:
+                    self.log.write(
+                        f'Skipping "{title}" because it is longer than '
+                        f'max length of {self.config.max_length}.',
+                        log_level=0
+                    )
+                    continue
+                queue.put(item)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'failed retrieving items: {err}', True)
+        finally:
+            queue.put(None)
+
+    @TIMER.timed('save_cache')
     def save_cache(self):
         """save cache and podcast pickle"""
         try:
@@ -141,14 +203,15 @@ class Main(object):
                     pickle.dump([self.cache, self.pod.p], f)
                 if self.config.state_file_path:
                     try:
-                        rsync(
-                            source=self.config.pickle,
-                            destination=self.config.state_file_path,
-                            keyfile=self.config.ssh_keyfile,
-                            debug=self.config.debug,
-                            recursive=False,
-                            size_only=False
-                        )
+                        with span('state_sync', direction='upload'):
+                            rsync(
+                                source=self.config.pickle,
+                                destination=self.config.state_file_path,
+                                keyfile=self.config.ssh_keyfile,
+                                debug=self.config.debug,
+                                recursive=False,
+                                size_only=False
+                            )
                         self.log.write(
                             'state file synced successfully to server')
                     except Exception as err:  # pylint: disable=broad-except
@@ -161,46 +224,72 @@ class Main(object):
 
     def process_wallabag(self, tag):
         """process wallabag items matching tag"""
+        from wallabag import Wallabag
         wallabag = Wallabag(config=self.config.wallabag, log=self.log)
-        items = wallabag.get_items(tag)
+        items = TIMER.iterate(wallabag.get_items(tag), 'get_items', source='wallabag')
         return self.process(items)
 
     def process_link(self, url, title=None):
         """process link content from URL"""
+        if url in self.cache and not self.force:
+            # known before fetching, so skip the download and extraction too
+            self.log.write(
+                f'Skipping {url} because it is already in the feed. '
+                'Use --force to regenerate previously processed content.',
+                log_level=1
+            )
+            return False
+        from links import Links
         links = Links(config=self.config.links, log=self.log)
-        items = links.get_items(url, title)
+        with span('get_items', source='link'):
+            items = links.get_items(url, title)
         return self.process(items)
 
     def process_pocket(self, tag='audio'):
         """process pocket items matching tag"""
+        from links import Links
+        from ttspocket import TTSPocket
         links = Links(config=self.config.links, log=self.log)
         p = TTSPocket(config=self.config.pocket, links=links, log=self.log)
-        items = p.get_items(tag)
+        items = TIMER.iterate(p.get_items(tag), 'get_items', source='pocket')
         return self.process(items)
 
     def process_insta(self, tag):
         """process instapaper items matching tag"""
+        from ttsinsta import TTSInsta
         p = TTSInsta(config=self.config.insta, log=self.log)
-        items = p.get_items(tag)
+        items = TIMER.iterate(p.get_items(tag), 'get_items', source='instapaper')
         return self.process(items)
 
     def process_content(self, text, title=None):
         """process any sort of text content"""
+        from content import Content
         content = Content(config=self.config.content, log=self.log)
-        items = content.get_items(text, title)
+        with span('get_items', source='content'):
+            items = content.get_items(text, title)
         return self.process(items)
 
     def process_file(self, fname, title=None):
         """process input from files"""
+        from content import Content
         content = Content(config=self.config.content, log=self.log)
-        items = content.process_file(fname, title)
+        with span('get_items', source='file'):
+            items = content.process_file(fname, title)
         return self.process(items)
 
-    def finalize(self):
-        """finalize session by saving and syncing podcast and cache"""
+    def publish(self):
+        """save and sync podcast and cache"""
         if not self.dry:
-            self.pod.save()
-            self.pod.sync()
+            with span('pod_save'):
+                self.pod.save()
+            with span('pod_sync'):
+                self.pod.sync()
             self.save_cache()
+        TIMER.flush()
+        return True
+
+    def finalize(self):
+        """finalize session by saving and syncing podcast and cache"""
+        self.publish()
         self.log.close()
         return True
@@ -64,7 +64,8 @@ class Pod(object):
                 recursive=False,
                 debug=self.config.debug,
                 dry_run=False,
-                size_only=True
+                size_only=True,
+                channels=self.config.ssh_channels
             )
         else:
             self.log.write(
@@ -0,0 +1,212 @@
+"""registry of TTS backends, imported only once one is selected"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from importlib import import_module
+    from importlib.util import find_spec
+    from os import path
+    import sys
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# entry point group third-party packages register extra backends under
+ENTRY_POINT_GROUP = 'ttspod.backends'
+# built-in factories are flat modules in the speech directory
+SPEECH_PATH = path.join(path.dirname(path.realpath(__file__)), 'speech')
+BACKENDS = None  # name to Backend, built on first use by backends
+
+
+class Backend(object):
+    """
+    declaration of one TTS backend
+
+    everything needed to list, choose between and check the availability of
+    backends is plain data here; the module that does the synthesis, and the
+    torch or API client stack behind it, is only imported by load
+
+    :param name: unique name of the backend, e.g. 'xtts'
+    :param factory: 'module:attribute' of the engine class, which is called
+                    with config and log keyword arguments and must provide
+                    convert(text, output_file)
+    :param engine: value of ttspod_engine that selects it (defaults to name)
+    :param model: value of ttspod_model that selects it within engine, None for any
+    :param generator: optional 'module:attribute' of a model class that a
+                      wrapper factory (such as the coqui one) builds around
+    :param packages: top-level packages that must be installed
+    :param sample_rate: sample rate of the generated audio in Hz
+    :param batching: whether several chunks are synthesized in one call
+    :param streaming: whether audio is written out while synthesis continues
+    :param cloning: whether a voice can be cloned from reference audio
+    :param cost: US dollars per million characters, 0 for local synthesis
+    :param speed: rough real-time factor on a CPU (wall seconds per second
+                  of audio), None if unknown; ttspod --stats has measured values
+    :param description: one line for listings
+    :param model_setting: speech setting naming the model in use, None to
+                          report model (or name) instead
+    :param voice_setting: speech setting naming the voice in use
+    """
+
+    def __init__(self, name, factory, engine=None, model=None, generator=None,
+                 packages=None, sample_rate=24000, batching=False, streaming=False,
+                 cloning=False, cost=0.0, speed=None, description='',
+                 model_setting=None, voice_setting='voice'):
+        self.name = name
+        self.factory = factory
+        self.engine = engine or name
+        self.model = model
+        self.generator = generator
+        self.packages = list(packages or [])
+        self.sample_rate = sample_rate
+        self.batching = batching
+        self.streaming = streaming
+        self.cloning = cloning
+        self.cost = cost
+        self.speed = speed
+        self.description = description
+        self.model_setting = model_setting
+        self.voice_setting = voice_setting
+
+    def __repr__(self):
+        return f'Backend({self.name!r}, engine={self.engine!r}, model={self.model!r})'
+
+    def available(self):
+        """whether the required packages are installed, located without importing them"""
+        for package in self.packages:
+            try:
+                if find_spec(package) is None:
+                    return False
+            except (ImportError, ValueError):
+                return False
+        return True
+
+    def load(self, attribute='factory'):
+        """import and return the factory (or generator) class"""
+        target = getattr(self, attribute)
+        if not target:
+            raise ValueError(f'backend {self.name} has no {attribute}')
+        (module, _, name) = target.partition(':')
+        if SPEECH_PATH not in sys.path:
+            sys.path.append(SPEECH_PATH)
+        result = import_module(module)
+        for part in name.split('.') if name else []:
+            result = getattr(result, part)
+        return result
+
+    def create(self, config=None, log=None):
+        """instantiate the engine, importing its stack"""
+        return self.load()(config=config, log=log)
+
+    def label(self, config=None):
+        """(model, voice) this backend synthesizes with under speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        model = c.get(self.model_setting) if self.model_setting else None
+        # drop repository prefixes such as collabora/whisperspeech:
+        model = str(model).split(':')[-1] if model else self.model or self.name
+        voice = c.get(self.voice_setting) if self.voice_setting else None
+        return (model, str(voice))
+
+    def describe(self):
+        """declared properties as a dictionary"""
+        return {x: getattr(self, x) for x in
+                ['name', 'engine', 'model', 'packages', 'sample_rate', 'batching',
+                 'streaming', 'cloning', 'cost', 'speed', 'description']}
+
+
+BUILTIN = [
+    Backend('xtts', 'coqui:Coqui', engine='coqui', model='xtts', generator='xtts:Xtts',
+            packages=['TTS'], batching=True, streaming=True, cloning=True, speed=2.0,
+            description='Coqui XTTS v2, local, clones a voice from a few wav samples'),
+    Backend('tortoise', 'coqui:Coqui', engine='coqui', model='tortoise',
+            generator='tortoise:Tortoise', packages=['TTS'], streaming=True, cloning=True,
+            speed=20.0, description='Coqui Tortoise, local, slow but expressive'),
+    Backend('whisper', 'whisper:Whisper', packages=['whisperspeech'], batching=True,
+            streaming=True, cloning=True, speed=4.0, model_setting='whisper_t2s_model',
+            description='WhisperSpeech, local, GPU recommended'),
+    Backend('f5', 'f5:F5', packages=['f5_tts'], streaming=True, cloning=True, speed=3.0,
+            description='F5-TTS, local, clones a voice from a short sample'),
+    Backend('openai', 'paid:Paid', packages=['openai'], cost=15.0, speed=0.1,
+            model_setting='openai_model', voice_setting='openai_voice',
+            description='OpenAI speech API, paid'),
+    Backend('eleven', 'paid:Paid', packages=['elevenlabs'], cloning=True, cost=180.0,
+            speed=0.1, model_setting='eleven_model', voice_setting='eleven_voice',
+            description='ElevenLabs API, paid')
+]
+
+
+def plugins():
+    """backends registered by installed packages under ENTRY_POINT_GROUP"""
+    # importlib.metadata is slow to import and only needed once a backend is looked up
+    from importlib.metadata import entry_points  # pylint: disable=import-outside-toplevel
+    found = []
+    try:
+        points = entry_points(group=ENTRY_POINT_GROUP)
+    except Exception:  # pylint: disable=broad-except
+        return found
+    for point in points:
+        try:
+            loaded = point.load()
+        except Exception as err:  # pylint: disable=broad-except
+            print(f'failed loading TTS backend {point.name}: {err}')
+            continue
+        if callable(loaded) and not isinstance(loaded, Backend):
+            loaded = loaded()
+        found += loaded if isinstance(loaded, (list, tuple)) else [loaded]
+    return [x for x in found if isinstance(x, Backend)]
+
+
+def backends():
+    """every known backend by name; plugins may replace built-ins of the same name"""
+    global BACKENDS  # pylint: disable=global-statement
+    if BACKENDS is None:
+        BACKENDS = {x.name: x for x in BUILTIN + plugins()}
+    return BACKENDS
+
+
+def register(backend):
+    """add or replace a backend at run time"""
+    backends()[backend.name] = backend
+    return backend
+
+
+def select(engine, model=None):
+    """
+    backend for the configured engine and model
+
+    engine may also name a backend directly, e.g. ttspod_engine=tortoise;
+    a backend that declares a model only matches when model equals it, or
+    when model is unset and it is the first one declared for engine
+
+    :return: Backend, or None if nothing matches
+    """
+    engine = str(engine or '').lower()
+    model = str(model or '').lower()
+    known = backends()
+    if engine in known and known[engine].engine != engine:
+        return known[engine]
+    candidates = [x for x in known.values() if x.engine == engine]
+    for backend in candidates:
+        if backend.model is None or backend.model == model:
+            return backend
+    if candidates and not model:
+        return candidates[0]
+    return None
+
+
+def available():
+    """names of the engines (values of ttspod_engine) with at least one installed backend"""
+    return sorted({x.engine for x in backends().values() if x.available()})
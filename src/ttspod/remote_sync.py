@@ -7,14 +7,18 @@ except ImportError:
     pass
 
 try:
+    from concurrent.futures import ThreadPoolExecutor
     from getpass import getuser
     from pathlib import Path
     from platform import system
     from posixpath import join as posix_join, split as posix_split
+    from threading import Lock, local
+    from weakref import WeakSet
     import hashlib
     import os
     import paramiko
     import re
+    import shlex
     import shutil
     import stat
 except ImportError as e:
@@ -27,6 +31,16 @@ except ImportError as e:
 # TODO: rework the debug/DBG and output logic
 # probably want to just generate a string with output and return it
 DBG = False
+BATCH = 100  # remote paths per checksum command
+EXEC_TIMEOUT = 5  # seconds to wait for output from a remote checksum command
+MARKER = 'ttspod-md5'  # echoed around the checksums to show a shell ran them
+NO_EXEC = WeakSet()  # connections whose server does not run remote commands
+# SFTP channel flow control: bytes the server may send before we acknowledge,
+# and the largest packet we accept; paramiko defaults to 2 MB and 32 KB, which
+# caps a single download at 2 MB per round trip on high-latency links
+WINDOW_SIZE = 2**24
+PACKET_SIZE = 2**17
+PREFETCH = 64  # read requests in flight per download
 
 
 def md5(file_path):
@@ -37,12 +51,9 @@ def md5(file_path):
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
-# TODO: this should be refactored to perform the MD5 remotely
-# otherwise it's probably not getting any speed benefit
-
 
 def remote_get_md5(sftp, remote_file):
-    """Calculate the MD5 hash of a remote file."""
+    """Calculate the MD5 hash of a remote file by reading it over SFTP."""
     try:
         # Open remote file
         with sftp.file(remote_file, "rb") as f:
@@ -58,6 +69,121 @@ def remote_get_md5(sftp, remote_file):
         return None
 
 
+def remote_exec_md5(ssh, remote_files):
+    """
+    Calculate MD5 hashes of remote files on the server.
+
+    Runs md5sum (or md5 -r on BSD and macOS) over an SSH exec channel and
+    returns a dictionary of the files it reported, or None if the server
+    does not run commands: it rejects them, or accepts them without running
+    a shell (an SFTP-only account with ForceCommand internal-sftp), which
+    shows as output without the MARKER lines around the checksums.
+    """
+    quoted = ' '.join(shlex.quote(x) for x in remote_files)
+    command = (f'echo {MARKER}; if command -v md5sum >/dev/null 2>&1; then md5sum -- {quoted}; '
+               f'else md5 -r {quoted}; fi 2>/dev/null; echo {MARKER}')
+    try:
+        stdin, stdout, _ = ssh.exec_command(command, timeout=EXEC_TIMEOUT)
+        stdin.channel.shutdown_write()
+        try:
+            lines = stdout.read().decode('utf-8', 'replace').splitlines()
+        finally:
+            stdout.channel.close()
+    except Exception:  # pylint: disable=broad-except
+        lines = []
+    if len(lines) < 2 or lines[0] != MARKER or lines[-1] != MARKER:
+        if DBG:
+            print('Remote commands not available, hashing over SFTP.')
+        return None
+    wanted = set(remote_files)
+    hashes = {}
+    for line in lines[1:-1]:
+        m = re.match(r'([0-9a-f]{32}) [ *]?(.*)$', line)
+        if m and m.group(2) in wanted:
+            hashes[m.group(2)] = m.group(1)
+    return hashes
+
+
+def remote_get_md5s(ssh, sftp, remote_files):
+    """
+    Calculate MD5 hashes of a batch of remote files, None for missing ones.
+
+    Hashes are computed on the server, one command per BATCH files, so only
+    the hashes cross the network; files the command does not report (missing
+    files, unusual names) and all files on servers that allow SFTP only are
+    hashed by reading them over SFTP instead; a server found not to run
+    commands is not asked again on the same connection.
+    """
+    remote_files = list(dict.fromkeys(remote_files))
+    hashes = {}
+    for start in range(0, len(remote_files), BATCH):
+        if not ssh or ssh in NO_EXEC:
+            break
+        result = remote_exec_md5(ssh, remote_files[start:start + BATCH])
+        if result is None:
+            NO_EXEC.add(ssh)
+            break
+        hashes.update(result)
+    for remote_file in remote_files:
+        if remote_file not in hashes:
+            hashes[remote_file] = remote_get_md5(sftp, remote_file)
+    return hashes
+
+
+def open_channel(ssh):
+    """open an SFTP channel with large flow-control windows on an SSH connection"""
+    return paramiko.SFTPClient.from_transport(
+        ssh.get_transport(), window_size=WINDOW_SIZE, max_packet_size=PACKET_SIZE)
+
+
+def transfer(ssh, jobs, channels=4):
+    """
+    run uploads and downloads over several SFTP channels of one SSH connection
+
+    each worker thread opens its own channel, so one file's round trips (open,
+    close, utime, chmod, stat) overlap with another's data; uploads are
+    pipelined by paramiko and not confirmed with an extra stat, downloads are
+    prefetched with PREFETCH requests in flight
+
+    :param jobs: list of ('put', local_file, remote_file) or
+                 ('get', remote_file, local_file)
+    :param channels: most files in transfer at once
+    """
+    if not jobs:
+        return
+    channels = max(min(int(channels or 1), len(jobs)), 1)
+    threads = local()
+    clients = []
+    lock = Lock()
+
+    def run(job):
+        sftp = getattr(threads, 'sftp', None)
+        if sftp is None:
+            sftp = threads.sftp = open_channel(ssh)
+            with lock:
+                clients.append(sftp)
+        (direction, source, target) = job
+        if DBG:
+            print(f'{direction} {source} -> {target}')
+        if direction == 'put':
+            local_stat = os.stat(source)
+            sftp.put(source, target, confirm=False)
+            sftp.utime(target, (local_stat.st_atime, local_stat.st_mtime))
+            sftp.chmod(target, local_stat.st_mode)
+        else:
+            remote_stat = sftp.stat(source)
+            sftp.get(source, target, max_concurrent_prefetch_requests=PREFETCH)
+            os.utime(target, (remote_stat.st_atime, remote_stat.st_mtime))
+
+    try:
+        with ThreadPoolExecutor(max_workers=channels) as executor:
+            for _ in executor.map(run, jobs):
+                pass
+    finally:
+        for sftp in clients:
+            sftp.close()
+
+
 def get_remote_size(sftp, remote_file):
     """Query the file size of a remote file."""
     try:
@@ -197,9 +323,12 @@ def sync(
     size_only=False,
     debug=False,
     dry_run=False,
-    recursive=False
+    recursive=False,
+    channels=4
 ):
-    """Sync source folder or file to destination folder."""
+    """Sync source folder or file to destination folder.
+
+    Remote transfers run over up to channels concurrent SFTP channels."""
     global DBG  # pylint: disable=global-statement
     DBG = debug
     ssh = None
@@ -372,7 +501,11 @@ def sync(
         )
 
     # Sync files
+    jobs = []  # remote transfers, run together once all files are compared
     if destination_host:  # local source to remote destination
+        remote_hashes = {} if size_only else remote_get_md5s(ssh, sftp, [
+            destination_dir if file_only and not destination_trail
+            else posix_join(destination_dir, x) for x in files])
         for filename in files:
             # local system can be Linux/Mac/Windows
             local_file = os.path.join(source_dir, filename)
@@ -392,7 +525,7 @@ def sync(
                 if DBG:
                     print(f'local {local_check}... ', end='')
                 remote_check = get_remote_size(
-                    sftp, remote_file) if size_only else remote_get_md5(sftp, remote_file)
+                    sftp, remote_file) if size_only else remote_hashes.get(remote_file)
                 if DBG:
                     print(f'remote {remote_check}... ', end='')
                 if remote_check is None:
@@ -400,21 +533,13 @@ def sync(
                         print(
                             f"File {filename} does not exist on the remote server. Uploading...")
                     if not dry_run:
-                        local_stat = os.stat(local_file)
-                        times = (local_stat.st_atime, local_stat.st_mtime)
-                        sftp.put(local_file, remote_file)
-                        sftp.utime(remote_file, times)
-                        sftp.chmod(remote_file, local_stat.st_mode)
+                        jobs.append(('put', local_file, remote_file))
                 elif local_check != remote_check:
                     if DBG:
                         print(
                             f"File {filename} is different. Uploading updated version...")
                     if not dry_run:
-                        local_stat = os.stat(local_file)
-                        times = (local_stat.st_atime, local_stat.st_mtime)
-                        sftp.put(local_file, remote_file)
-                        sftp.utime(remote_file, times)
-                        sftp.chmod(remote_file, local_stat.st_mode)
+                        jobs.append(('put', local_file, remote_file))
                 else:
                     if DBG:
                         print(
@@ -422,6 +547,11 @@ def sync(
             elif DBG:
                 print(f"Could not find source file {filename}.")
     elif source_host:  # remote source to local destination
+        # only files already present locally need comparing
+        remote_hashes = {} if size_only else remote_get_md5s(ssh, sftp, [
+            posix_join(source_dir, x) for x in files
+            if os.path.isfile(os.path.join(destination_dir, x)
+                              if not file_only or destination_trail else destination_dir)])
         for filename in files:
             # assume remote system supports POSIX paths
             remote_file = posix_join(source_dir, filename)
@@ -437,7 +567,7 @@ def sync(
             local_check = None
             if os.path.isfile(local_file):
                 remote_check = get_remote_size(
-                    sftp, remote_file) if size_only else remote_get_md5(sftp, remote_file)
+                    sftp, remote_file) if size_only else remote_hashes.get(remote_file)
                 if DBG:
                     print(f'remote {remote_check}... ', end='')
                 local_check = os.path.getsize(
@@ -449,10 +579,7 @@ def sync(
                         print(
                             f"File {filename} is different. Downloading updated version...")
                     if not dry_run:
-                        remote_stat = sftp.stat(remote_file)
-                        times = (remote_stat.st_atime, remote_stat.st_mtime)
-                        sftp.get(remote_file, local_file)
-                        os.utime(local_file, times)
+                        jobs.append(('get', remote_file, local_file))
                 else:
                     if DBG:
                         print(
@@ -462,10 +589,7 @@ def sync(
                     print(
                         f"File {filename} does not exist on the local server. Downloading...")
                 if not dry_run:
-                    remote_stat = sftp.stat(remote_file)
-                    times = (remote_stat.st_atime, remote_stat.st_mtime)
-                    sftp.get(remote_file, local_file)
-                    os.utime(local_file, times)
+                    jobs.append(('get', remote_file, local_file))
     else:  # local source to local destination
         for filename in files:
             local_file = os.path.join(source_dir, filename)
@@ -508,6 +632,9 @@ def sync(
                     print(f'Copy failed with error {err}')
 
     if sftp and ssh:
-        # Close connection
-        sftp.close()
-        ssh.close()
+        try:
+            transfer(ssh, jobs, channels)
+        finally:
+            # Close connection
+            sftp.close()
+            ssh.close()
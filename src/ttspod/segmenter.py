@@ -0,0 +1,147 @@
+"""rule-based sentence segmenter that needs no language model"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from sys import argv
+    import re
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# abbreviations that are normally followed by a period but do not end a
+# sentence, in any capitalization; none of them is also an English word
+ABBREVIATIONS = frozenset([
+    'mr', 'mrs', 'ms', 'mx', 'dr', 'prof', 'sr', 'jr', 'st', 'rev', 'fr', 'hon',
+    'lt', 'sgt', 'capt', 'cmdr', 'adm', 'maj', 'gov', 'sen',
+    'pres', 'supt', 'insp', 'messrs', 'mme', 'mlle',
+    'inc', 'ltd', 'corp', 'bros', 'llc', 'plc', 'dept', 'univ', 'assn',
+    'ave', 'blvd', 'rd', 'mt', 'ft', 'hwy', 'apt', 'ste',
+    'jan', 'feb', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+    'mon', 'tue', 'tues', 'wed', 'thu', 'thurs', 'fri',
+    'vs', 'etc', 'cf', 'approx', 'figs', 'nos', 'vols', 'pp', 'eds', 'cit', 'ibid', 'viz',
+    'e.g', 'i.e', 'a.m', 'p.m', 'u.s', 'u.k', 'u.n', 'ph.d', 'd.c'
+])
+# abbreviations spelled like ordinary words ("art.", "no.", "sat."), which
+# count only in their capitalized form
+CAPITALIZED = frozenset(['Gen', 'Col', 'Rep', 'Co', 'Mar', 'Sat', 'Sun'])
+# and those that count only when capitalized and followed by a number ("No. 5")
+NUMBERED = frozenset(['No', 'Fig', 'Vol', 'Sec', 'Art', 'Ch', 'Op', 'Ed', 'Est'])
+
+# a run of terminal punctuation, optional closing quotes or brackets, then
+# whitespace and something that can start a sentence
+BOUNDARY = re.compile(r'([.!?…]+)(["\'”’)\]]*)(\s+)(?=["\'“‘(\[]*[A-Z0-9])')
+LAST_WORD = re.compile(r'(\S+)$')
+PARAGRAPH = re.compile(r'\n\s*\n')
+
+
+def is_boundary(text, match) -> bool:
+    """decide whether a candidate BOUNDARY match really ends a sentence"""
+    if match.group(1) != '.' or match.group(2):
+        return True
+    word = LAST_WORD.search(text, 0, match.start())
+    if not word:
+        return True
+    cased = word.group(1).lstrip('"\'(“‘[').rstrip('.')
+    word = cased.lower()
+    if word in ABBREVIATIONS or cased in CAPITALIZED:
+        return False
+    if cased in NUMBERED and text[match.end():match.end() + 1].isdigit():
+        return False
+    if word == 'al' and re.search(r'\bet\s+\S+$', text[:match.start()]):  # "et al."
+        return False
+    if len(word) == 1 and word.isalpha():  # initials such as "J. Smith"
+        return False
+    if re.fullmatch(r'(?:[a-z]\.)+[a-z]', word):  # dotted acronyms such as "U.S.A."
+        return False
+    return True
+
+
+def split_sentences(text) -> list[str]:
+    """
+    split a paragraph into sentences
+
+    boundaries are terminal punctuation followed by whitespace and a capital
+    letter, digit or opening quote, except after known abbreviations,
+    single-letter initials and dotted acronyms; line breaks are treated as
+    ordinary whitespace
+
+    :param text: paragraph to split
+    """
+    sentences = []
+    start = 0
+    for match in BOUNDARY.finditer(text):
+        if not is_boundary(text, match):
+            continue
+        sentence = text[start:match.end(2)].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    sentence = text[start:].strip()
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
+def segment(text, segmenter='spacy') -> list[str]:
+    """
+    split text into sentences, paragraph by paragraph
+
+    :param text: text to split
+    :param segmenter: 'spacy' for the statistical parser, 'rules' for split_sentences
+    """
+    paragraphs = [x for x in PARAGRAPH.split(text) if x.strip()]
+    if str(segmenter).lower() == 'rules':
+        return [x for para in paragraphs for x in split_sentences(para)]
+    # pylint: disable=import-outside-toplevel
+    from util import get_spacy
+    nlp = get_spacy()
+    sentences = [sent.text.strip()
+                 for doc in nlp.pipe(paragraphs) for sent in doc.sents]
+    return [x for x in sentences if x]
+
+
+def boundaries(sentences) -> set:
+    """character offsets, ignoring whitespace, at which each sentence ends"""
+    offsets = set()
+    position = 0
+    for sentence in sentences:
+        position += len(re.sub(r'\s+', '', sentence))
+        offsets.add(position)
+    return offsets
+
+
+def agreement(text) -> dict:
+    """
+    compare rule-based boundaries with spaCy's on text
+
+    :return: precision, recall and f1 of the rule-based boundaries against spaCy
+    """
+    reference = boundaries(segment(text, 'spacy'))
+    candidate = boundaries(segment(text, 'rules'))
+    common = len(reference & candidate)
+    precision = common / len(candidate) if candidate else 1.0
+    recall = common / len(reference) if reference else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': precision, 'recall': recall, 'f1': f1,
+            'spacy': len(reference), 'rules': len(candidate)}
+
+
+if __name__ == '__main__':
+    if len(argv) < 2:
+        print('usage: segmenter.py FILE [FILE ...]\n'
+              'reports agreement of rule-based sentence boundaries with spaCy')
+        exit()
+    for fname in argv[1:]:
+        with open(fname, 'r', encoding='utf-8') as f:
+            result = agreement(f.read())
+        print(f"{fname}: precision {result['precision']:.3f} recall {result['recall']:.3f} "
+              f"f1 {result['f1']:.3f} ({result['rules']} rule / {result['spacy']} spacy)")
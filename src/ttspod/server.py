@@ -0,0 +1,161 @@
+"""resident synthesis worker that keeps TTS models loaded between invocations"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from getpass import getuser
+    from os import chmod, path, remove, environ as e
+    from tempfile import gettempdir
+    from traceback import format_exc
+    import json
+    import socket
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+
+
+def socket_path():
+    """location of the worker socket, overridden by the ttspod_socket environment variable"""
+    return e.get('ttspod_socket') or path.join(gettempdir(), f'ttspod-{getuser()}.sock')
+
+
+def submit(request, location=None):
+    """
+    hand a job to a running worker
+
+    returns the worker's reply, or None if no worker is listening
+
+    :param request: dictionary describing the job
+    :param location: path of the worker socket
+    """
+    location = location if location else socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not path.exists(location):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(location)
+            client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            client.shutdown(socket.SHUT_WR)
+            reply = read_all(client)
+    except OSError:
+        return None
+    try:
+        return json.loads(reply)
+    except ValueError:
+        return None
+
+
+def read_all(connection):
+    """read from a socket until the peer closes its side"""
+    data = b''
+    while True:
+        block = connection.recv(65536)
+        if not block:
+            return data.decode('utf-8')
+        data += block
+
+
+class Server(object):
+    """listen on a local socket and run submitted jobs on a resident Main instance"""
+
+    def __init__(self, main, location=None, log=None):
+        self.main = main
+        self.log = log if log else Logger(debug=True)
+        self.location = location if location else socket_path()
+        self.main.load_speech()
+
+    def serve(self):
+        """accept jobs until interrupted"""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('ttspod worker requires UNIX socket support')
+        if path.exists(self.location):
+            if submit({'ping': True}, self.location) is not None:
+                raise ValueError(
+                    f'another ttspod worker is already listening on {self.location}')
+            remove(self.location)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.location)
+            chmod(self.location, 0o600)
+            listener.listen()
+            self.log.write(
+                f'ttspod worker listening on {self.location}', True)
+            while True:
+                connection, _ = listener.accept()
+                with connection:
+                    try:
+                        request = json.loads(read_all(connection))
+                    except ValueError:
+                        request = {}
+                    reply = self.handle(request)
+                    try:
+                        connection.sendall(json.dumps(reply).encode('utf-8'))
+                    except OSError:
+                        pass
+        except KeyboardInterrupt:
+            self.log.write('ttspod worker shutting down', True)
+        finally:
+            listener.close()
+            if path.exists(self.location):
+                remove(self.location)
+            self.main.log.close()
+
+    def handle(self, request):
+        """
+        run a single job
+
+        :param request: dictionary describing the job, as built by App.run
+        """
+        if request.get('ping'):
+            return {'status': 'ok', 'message': 'pong'}
+        config_path = self.main.config.config_path
+        if request.get('config') != (path.realpath(config_path) if config_path else None):
+            return {
+                'status': 'declined',
+                'message': f'worker is using configuration {self.main.config.config_path}'
+            }
+        speech = self.main.config.speech
+        for setting in ['engine', 'model']:
+            wanted = request.get(setting)
+            if wanted and wanted.lower() != getattr(speech, setting):
+                return {
+                    'status': 'declined',
+                    'message': f'worker is running {setting} {getattr(speech, setting)}'
+                }
+        try:
+            self.main.force = bool(request.get('force'))
+            self.main.refresh()
+            title = request.get('title')
+            if request.get('text'):
+                self.main.process_content(request['text'], title)
+            if request.get('wallabag'):
+                self.main.process_wallabag(request['wallabag'])
+            if request.get('pocket'):
+                self.main.process_pocket(request['pocket'])
+            if request.get('insta'):
+                self.main.process_insta(request['insta'])
+            for link in request.get('links', []):
+                self.main.process_link(link, title)
+            for fname in request.get('files', []):
+                self.main.process_file(fname, title)
+            self.main.publish()
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'worker job failed: {err}\n{format_exc()}', True)
+            return {'status': 'error', 'message': str(err)}
+        return {'status': 'ok', 'message': 'job completed by ttspod worker'}
+
+
+if __name__ == '__main__':
+    print("This is the TTSPod worker module. "
+          "Start it with ttspod --serve.")
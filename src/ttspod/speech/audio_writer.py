@@ -0,0 +1,285 @@
+"""streaming audio encoder that engines push chunk waveforms into"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from os import path, remove
+    from queue import Queue
+    from shutil import move, which
+    from tempfile import TemporaryFile
+    from threading import Thread
+    from time import perf_counter
+    from uuid import uuid4
+    import subprocess
+    import numpy as np
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# optional modules
+try:
+    import soundfile as sf
+    AVAILABLE_SOUNDFILE = True
+except ImportError:
+    AVAILABLE_SOUNDFILE = False
+
+# TTSPod modules
+from logger import Logger
+from timing import TIMER
+
+QUEUE_DEPTH = 32  # chunks buffered between synthesis and the encoder
+
+
+def loud_frames(frames, threshold):
+    """mask of the rows of frames whose level is above threshold dBFS"""
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1)) > 10 ** (threshold / 20)
+
+
+def squeeze_silence(wave, sample_rate, threshold=-50.0, min_silence=1.0, keep=0.5):
+    """
+    shorten long pauses in a waveform
+
+    the NumPy equivalent of joining the pieces pydub's split_on_silence
+    returns: stretches of at least min_silence seconds whose 10 ms frames are
+    all quieter than threshold dBFS keep only keep seconds next to the sound
+    on either side, so long pauses shrink to twice keep and leading or
+    trailing ones to keep; a waveform that is silent throughout comes back empty
+    """
+    wave = np.asarray(wave, dtype=np.float32).reshape(-1)
+    step = max(sample_rate // 100, 1)
+    count = len(wave) // step
+    if not count:
+        return wave
+    loud = loud_frames(wave[:count * step].reshape(count, step), threshold)
+    if not loud.any():
+        return wave[:0]
+    edges = np.diff(np.concatenate(([0], (~loud).astype(np.int8), [0])))
+    (starts, ends) = (np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+    (keep, min_silence) = (int(keep * 100), int(min_silence * 100))
+    cut_from = np.where(starts == 0, starts, starts + keep)
+    cut_to = np.where(ends == count, ends, ends - keep)
+    cut = (ends - starts >= min_silence) & (cut_to > cut_from)
+    delta = np.zeros(count + 1, dtype=np.int32)
+    np.add.at(delta, cut_from[cut], 1)
+    np.add.at(delta, cut_to[cut], -1)
+    kept = np.cumsum(delta[:-1]) == 0
+    mask = np.concatenate((np.repeat(kept, step), np.full(len(wave) - count * step, kept[-1])))
+    return wave[mask]
+
+
+class SilenceSqueezer(object):
+    """
+    squeeze_silence over a waveform that arrives in chunks
+
+    a pause can span the join between two chunks, so everything from the last
+    loud frame on is held back until a later chunk shows where the pause ends;
+    the concatenated output matches squeezing the whole waveform at once
+    """
+
+    def __init__(self, sample_rate, threshold=-50.0, min_silence=1.0, keep=0.5):
+        self.sample_rate = sample_rate
+        self.options = {'threshold': threshold, 'min_silence': min_silence, 'keep': keep}
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def feed(self, wave):
+        """add a chunk and return the squeezed audio no later chunk can change"""
+        wave = np.concatenate((self.pending, np.asarray(wave, dtype=np.float32).reshape(-1)))
+        step = max(self.sample_rate // 100, 1)
+        count = len(wave) // step
+        loud = np.flatnonzero(
+            loud_frames(wave[:count * step].reshape(count, step), self.options['threshold']))
+        if not len(loud):
+            self.pending = wave
+            return wave[:0]
+        # held back audio starts on a loud frame, so a pause after it is not
+        # mistaken for leading silence when the next chunk arrives
+        end = (loud[-1] + 1) * step
+        self.pending = wave[end - step:]
+        return squeeze_silence(wave[:end], self.sample_rate, **self.options)[:-step]
+
+    def flush(self):
+        """return the squeezed remainder at the end of the waveform"""
+        wave = squeeze_silence(self.pending, self.sample_rate, **self.options)
+        self.pending = self.pending[:0]
+        return wave
+
+
+class AudioWriter(object):
+    """
+    encode mono float audio to a file as it is produced
+
+    chunks are handed to a background thread that feeds ffmpeg (or libsndfile
+    when ffmpeg is missing), so encoding overlaps synthesis and only a few
+    chunks are ever held in memory; audio goes to a temporary file that
+    replaces output only once encoding has finished successfully, so a
+    failed or interrupted run never leaves a cut-off file behind
+
+    :param temp_path: directory for the partial file, by default that of output
+    """
+
+    def __init__(self, output, sample_rate=24000, log=None, temp_path=None):
+        self.log = log if log else Logger(debug=True)
+        self.output = str(output)
+        (name, extension) = path.splitext(path.basename(self.output))
+        # the extension is kept, since it selects the encoder's output format
+        self.partial = path.join(temp_path or path.dirname(self.output),
+                                 f'{name}.{uuid4()}.partial{extension}')
+        self.result = None
+        self.sample_rate = sample_rate
+        self.samples = 0
+        self.busy = 0.0  # seconds the encoder spent writing
+        self.error = None
+        self.queue = Queue(maxsize=QUEUE_DEPTH)
+        self.process = None
+        self.stderr = None
+        self.sink = None
+        ffmpeg = which('ffmpeg')
+        if ffmpeg:
+            self.stderr = TemporaryFile()
+            self.process = subprocess.Popen(
+                [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+                 '-f', 'f32le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+                 self.partial],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=self.stderr
+            )
+        elif AVAILABLE_SOUNDFILE:
+            extension = extension.lstrip('.').upper() or 'MP3'
+            self.sink = sf.SoundFile(self.partial, 'w', samplerate=sample_rate,
+                                     channels=1, format=extension)
+        else:
+            raise ValueError('no audio encoder available, install ffmpeg')
+        self.thread = Thread(target=self.encode, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_config(cls, output, sample_rate=24000, config=None, log=None):
+        """build a writer keeping its partial file in the temp_path of speech settings"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(output, sample_rate, log=log, temp_path=c.get('temp_path'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    def abort(self):
+        """stop encoding and discard the partial file, leaving output untouched"""
+        if self.thread is None:
+            return
+        if self.process:
+            self.process.kill()
+        self.error = self.error or 'aborted'
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.process:
+            self.process.wait()
+            self.stderr.close()
+        elif self.sink:
+            try:
+                self.sink.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        self.discard()
+        self.result = False
+
+    def discard(self):
+        """remove the partial file"""
+        if path.isfile(self.partial):
+            try:
+                remove(self.partial)
+            except OSError:
+                pass
+
+    def write(self, wave):
+        """queue a chunk of audio samples for encoding"""
+        if wave is None:
+            return
+        wave = np.asarray(wave, dtype=np.float32).reshape(-1)
+        self.samples += len(wave)
+        self.queue.put(wave)
+
+    def silence(self, seconds=0.5):
+        """queue a stretch of silence"""
+        self.write(np.zeros(int(self.sample_rate * seconds), dtype=np.float32))
+
+    def encode(self):
+        """background encoder loop"""
+        while (wave := self.queue.get()) is not None:
+            if self.error:
+                continue  # drain the queue so producers never block
+            start = perf_counter()
+            try:
+                if self.process:
+                    self.process.stdin.write(wave.astype('<f4').tobytes())
+                else:
+                    self.sink.write(wave)
+            except Exception as err:  # pylint: disable=broad-except
+                self.error = err
+            self.busy += perf_counter() - start
+
+    def close(self):
+        """
+        flush remaining audio and move the finished file onto output
+
+        :return: True on success; on failure output is removed, since it would
+                 not hold this audio
+        """
+        if self.thread is None:
+            return bool(self.result)
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        start = perf_counter()
+        if self.process:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            if self.process.wait() != 0 and not self.error:
+                self.stderr.seek(0)
+                self.error = self.stderr.read().decode('utf-8', 'ignore').strip() or \
+                    f'ffmpeg exited with status {self.process.returncode}'
+            self.stderr.close()
+        elif self.sink:
+            self.sink.close()
+        # encoding overlaps synthesis, so the span is the encoder's own busy time
+        TIMER.record('encode', self.busy + perf_counter() - start,
+                     encoder='ffmpeg' if self.process else 'soundfile',
+                     seconds_of_audio=round(self.samples / self.sample_rate, 3))
+        if not self.error:
+            try:
+                move(self.partial, self.output)
+            except OSError as err:
+                self.error = err
+        self.result = not self.error
+        if self.error:
+            self.log.write(
+                f'failed encoding {self.output}: {self.error}', error=True)
+            self.discard()
+            if path.isfile(self.output):
+                remove(self.output)
+            return False
+        self.log.write(
+            f'encoded {round(self.samples / self.sample_rate)} seconds of audio '
+            f'to {self.output}', log_level=3)
+        return True
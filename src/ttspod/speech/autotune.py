@@ -0,0 +1,190 @@
+"""chunk lengths tuned per engine and device from measured synthesis speed"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from datetime import datetime
+    from os import getpid, path, replace
+    from pathlib import Path
+    from time import perf_counter
+    import json
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+from timing import span
+from util import chunk
+
+# reference passage synthesized while tuning: plain narrative prose
+PASSAGE = (
+    'A Hare was making fun of the Tortoise one day for being so slow. '
+    '"Do you ever get anywhere?" he asked with a mocking laugh. '
+    '"Yes," replied the Tortoise, "and I get there sooner than you think. '
+    'I\'ll run you a race and prove it." '
+    'The Hare was much amused at the idea of running a race with the Tortoise, '
+    'but for the fun of the thing he agreed. '
+    'So the Fox, who had consented to act as judge, marked the distance and started '
+    'the runners off. '
+    'The Hare was soon far out of sight, and to make the Tortoise feel very deeply how '
+    'ridiculous it was for him to try a race with a Hare, he lay down beside the course '
+    'to take a nap until the Tortoise should catch up. '
+    'The Tortoise meanwhile kept going slowly but steadily, and, after a time, passed the '
+    'place where the Hare was sleeping. '
+    'But the Hare slept on very peacefully; and when at last he did wake up, the Tortoise '
+    'was near the goal. '
+    'The Hare now ran his swiftest, but he could not overtake the Tortoise in time.'
+)
+# characters per second of audio that plausible English speech falls within;
+# outside it a chunk came out truncated or rambling
+SPEECH_RATE = (6.0, 30.0)
+# candidates within this fraction of the best real-time factor count as a tie,
+# which goes to the shorter chunk length
+TOLERANCE = 0.05
+
+
+class ChunkTuner(object):
+    """
+    pick the chunk length an engine synthesizes fastest on this device
+
+    short chunks pay the per-call overhead of the model (conditioning, decoder
+    start-up, padding) once per few words, which dominates on a CPU, while
+    long chunks take autoregressive models past the lengths they handle well;
+    each candidate maximum length is timed once on the same reference passage,
+    and the one with the lowest real-time factor whose every chunk still comes
+    out at a plausible speech rate is kept in a JSON file, keyed by engine,
+    device and the settings that affect speed, so tuning happens only once
+
+    :param tuning_path: JSON file holding tuned lengths
+    :param setting: 'auto' to tune on first use, a number of characters to
+                    use that length, or 'off' for the engine's built-in default
+    """
+
+    def __init__(self, tuning_path=None, setting='auto', log=None):
+        self.log = log if log else Logger(debug=True)
+        self.path = tuning_path
+        self.setting = str(setting if setting is not None else 'auto').strip().lower()
+
+    @classmethod
+    def from_config(cls, config=None, log=None):
+        """build a tuner from speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(tuning_path=c.get('tuning_path'), setting=c.get('chunk_size', 'auto'),
+                   log=log)
+
+    def load(self):
+        """tuned lengths by key"""
+        if not self.path or not path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:  # pylint: disable=broad-except
+            return {}
+
+    def save(self, key, result):
+        """store the result for key, keeping the other entries"""
+        if not self.path:
+            return
+        tuned = self.load()
+        tuned[key] = result
+        try:
+            Path(path.dirname(self.path) or '.').mkdir(parents=True, exist_ok=True)
+            temp = f'{self.path}.{getpid()}.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(tuned, f, indent=2)
+            replace(temp, self.path)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'failed saving chunk tuning to {self.path}: {err}', True)
+
+    def limits(self, key, candidates, probe, default, ratio=0.4, sample_rate=24000):
+        """
+        minimum and maximum chunk length to pass to util.chunk
+
+        :param key: list of values identifying engine, device and speed settings
+        :param candidates: maximum lengths to try, none above what the model handles well
+        :param probe: function synthesizing a list of texts into a list of waveforms
+        :param default: maximum length when tuning is off or fails
+        :param ratio: minimum length as a fraction of the maximum
+        :param sample_rate: sample rate of the waveforms probe returns
+        :return: (min_length, max_length)
+        """
+        if self.setting.isdigit() and int(self.setting) > 0:
+            max_length = int(self.setting)
+        elif self.setting != 'auto' or not candidates:
+            max_length = default
+        else:
+            key = ':'.join(str(x) for x in key)
+            tuned = self.load().get(key)
+            if tuned:
+                max_length = tuned['max_length']
+            else:
+                max_length = self.tune(key, candidates, probe, default, ratio, sample_rate)
+        return (max(round(max_length * ratio), 1), max_length)
+
+    def tune(self, key, candidates, probe, default, ratio=0.4, sample_rate=24000):
+        """time every candidate on the reference passage and store the best"""
+        candidates = sorted(set(int(x) for x in candidates))
+        # the same amount of text for every candidate, at least two of the longest chunks
+        budget = min(len(PASSAGE), 2 * candidates[-1])
+        self.log.write(f'tuning chunk length for {key}, trying {candidates}; '
+                       'this happens once per engine and device', log_level=1)
+        measured = {}
+        with span('autotune', key=key):
+            try:
+                probe([PASSAGE[:PASSAGE.index('.') + 1]])  # model warm-up, not timed
+            except Exception as err:  # pylint: disable=broad-except
+                self.log.write(f'chunk tuning failed, using {default}: {err}', True)
+                return default
+            for max_length in candidates:
+                texts = []
+                for text in chunk(PASSAGE, min_length=max(round(max_length * ratio), 1),
+                                  max_length=max_length, segmenter='rules'):
+                    texts.append(text)
+                    if sum(len(x) for x in texts) >= budget:
+                        break
+                try:
+                    start = perf_counter()
+                    waves = probe(texts)
+                    seconds = perf_counter() - start
+                except Exception as err:  # pylint: disable=broad-except
+                    self.log.write(f'chunk length {max_length} failed: {err}', log_level=1)
+                    measured[max_length] = None
+                    continue
+                durations = [len(x) / sample_rate for x in waves]
+                rates = [len(text) / duration if duration else 0
+                         for (text, duration) in zip(texts, durations)]
+                if not all(SPEECH_RATE[0] <= x <= SPEECH_RATE[1] for x in rates):
+                    self.log.write(f'chunk length {max_length} rejected, speech rates '
+                                   f"{', '.join(f'{x:.1f}' for x in rates)} characters "
+                                   'per second', log_level=1)
+                    measured[max_length] = None
+                    continue
+                measured[max_length] = round(seconds / sum(durations), 4)
+                self.log.write(f'chunk length {max_length}: real-time factor '
+                               f'{measured[max_length]:.2f}', log_level=2)
+        usable = {x: y for (x, y) in measured.items() if y is not None}
+        if not usable:
+            self.log.write(f'no chunk length could be tuned, using {default}', True)
+            return default
+        best = min(usable.values())
+        max_length = min(x for (x, y) in usable.items() if y <= best * (1 + TOLERANCE))
+        self.log.write(f'chunk length for {key} tuned to {max_length}', log_level=1)
+        self.save(key, {'max_length': max_length,
+                        'measured': {str(x): y for (x, y) in measured.items()},
+                        'time': datetime.now().isoformat(timespec='seconds')})
+        return max_length
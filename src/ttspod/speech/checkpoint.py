@@ -0,0 +1,148 @@
+"""per-chunk checkpoints so an interrupted synthesis can resume"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from glob import glob
+    from os import path, remove, replace
+    from pathlib import Path
+    from shutil import rmtree
+    from time import time
+    from uuid import uuid4
+    import hashlib
+    import json
+    import numpy as np
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+
+MAX_AGE = 7 * 24 * 3600  # abandoned checkpoints are removed after a week
+
+
+class Checkpoint(object):
+    """
+    progress of a single article synthesis
+
+    chunk audio is written to temp_path/checkpoints/<digest>/ as it is produced,
+    alongside a small manifest; the digest covers the engine settings and the
+    full list of chunks, so a rerun of the same article resumes where the
+    previous run stopped and any change to the text starts a fresh checkpoint
+    """
+
+    def __init__(self, temp_path=None, settings=None, texts=None, output=None, log=None):
+        self.log = log if log else Logger(debug=True)
+        self.texts = [str(x) for x in texts] if texts else []
+        self.state = {}
+        self.path = None
+        if not temp_path:
+            return
+        material = json.dumps([[str(x) for x in settings or []], self.texts])
+        digest = hashlib.sha256(material.encode('utf-8')).hexdigest()
+        base = path.join(temp_path, 'checkpoints')
+        self.path = path.join(base, digest[:32])
+        self.manifest = path.join(self.path, 'manifest.json')
+        try:
+            self.prune(base)
+            Path(self.path).mkdir(parents=True, exist_ok=True)
+            if path.isfile(self.manifest):
+                with open(self.manifest, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f).get('state', {})
+                done = self.resume_point()
+                if done:
+                    self.log.write(
+                        f'resuming synthesis at chunk {done+1} of {len(self.texts)}')
+            self.write_manifest(output)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'checkpoints disabled: {err}', log_level=1)
+            self.path = None
+
+    @classmethod
+    def from_config(cls, config=None, settings=None, texts=None, output=None, log=None):
+        """build a checkpoint in the temp_path of speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(temp_path=c.get('temp_path'), settings=settings,
+                   texts=texts, output=output, log=log)
+
+    def prune(self, base):
+        """remove checkpoints abandoned long ago"""
+        for manifest in glob(path.join(base, '*', 'manifest.json')):
+            try:
+                if time() - path.getmtime(manifest) > MAX_AGE:
+                    rmtree(path.dirname(manifest), ignore_errors=True)
+            except OSError:
+                pass
+
+    def write_manifest(self, output=None):
+        """record chunk list and engine state"""
+        if not self.path:
+            return
+        if output:
+            self.state['output'] = path.basename(str(output))
+        temp = f'{self.manifest}.{uuid4()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'chunks': [hashlib.sha256(x.encode('utf-8')).hexdigest() for x in self.texts],
+                'state': self.state
+            }, f)
+        replace(temp, self.manifest)
+
+    def location(self, index, name='audio'):
+        """file holding the checkpoint for a chunk"""
+        return path.join(self.path, f'{index:05d}-{name}.npy')
+
+    def get(self, index, name='audio'):
+        """return saved array for chunk index, or None"""
+        if not self.path:
+            return None
+        try:
+            return np.load(self.location(index, name), allow_pickle=False)
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    def put(self, index, array, name='audio'):
+        """save array for chunk index"""
+        if not self.path or array is None:
+            return False
+        fname = self.location(index, name)
+        temp = f'{fname}.{uuid4()}.tmp'
+        try:
+            with open(temp, 'wb') as f:
+                np.save(f, np.asarray(array), allow_pickle=False)
+            replace(temp, fname)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'failed to checkpoint chunk {index}: {err}', log_level=2)
+            if path.exists(temp):
+                remove(temp)
+            return False
+        return True
+
+    def resume_point(self, name='audio'):
+        """index of the first chunk without a checkpoint"""
+        if not self.path:
+            return 0
+        index = 0
+        while path.isfile(self.location(index, name)):
+            index += 1
+        return index
+
+    def clear(self):
+        """discard checkpoints once the output has been written"""
+        if self.path:
+            rmtree(self.path, ignore_errors=True)
+            self.path = None
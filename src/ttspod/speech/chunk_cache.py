@@ -0,0 +1,237 @@
+"""on-disk cache of synthesized chunk audio"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from glob import glob
+    from os import link, path, remove, replace, stat, utime, walk
+    from pathlib import Path
+    from shutil import copyfile
+    from uuid import uuid4
+    import hashlib
+    import json
+    import re
+    import numpy as np
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+
+CACHE_SIZE = 1024  # default cap in megabytes
+
+
+def fingerprint(voice):
+    """
+    stable identifier for a voice
+
+    files and directories of reference clips are identified by their contents,
+    anything else (e.g. a built-in speaker name) by its string value
+
+    :param voice: path, list of paths, or speaker name
+    """
+    if isinstance(voice, (list, tuple)):
+        files = [str(x) for x in voice]
+    elif voice and path.isdir(str(voice)):
+        files = sorted(glob(path.join(str(voice), '*')))
+    elif voice and path.isfile(str(voice)):
+        files = [str(voice)]
+    else:
+        return str(voice)
+    digest = hashlib.sha256()
+    for fname in sorted(files):
+        if not path.isfile(fname):
+            continue
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkCache(object):
+    """content-addressed store of per-chunk waveforms with LRU eviction"""
+
+    def __init__(self, cache_path=None, max_size=CACHE_SIZE, log=None):
+        self.log = log if log else Logger(debug=True)
+        self.path = cache_path
+        self.max_bytes = int(float(max_size if max_size is not None else CACHE_SIZE)
+                             * 1024 * 1024)
+        self.enabled = bool(self.path and self.max_bytes > 0)
+        self.size = None
+        if self.enabled:
+            try:
+                Path(self.path).mkdir(parents=True, exist_ok=True)
+            except Exception as err:  # pylint: disable=broad-except
+                self.log.write(
+                    f'chunk cache disabled, cannot create {self.path}: {err}', True)
+                self.enabled = False
+
+    @classmethod
+    def from_config(cls, config=None, log=None):
+        """build a cache from speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(cache_path=c.get('chunk_cache_path'),
+                   max_size=c.get('cache_size', CACHE_SIZE), log=log)
+
+    @staticmethod
+    def key(*settings, text=''):
+        """
+        digest identifying a chunk of audio
+
+        :param settings: engine, model, voice fingerprint and sampling parameters
+        :param text: chunk text, whitespace-normalized before hashing
+        """
+        normalized = re.sub(r'\s+', ' ', str(text)).strip()
+        material = json.dumps([str(x) for x in settings] + [normalized])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def location(self, key, extension='npy'):
+        """file holding the entry for key"""
+        return path.join(self.path, key[:2], f'{key}.{extension}')
+
+    def get(self, key):
+        """return cached waveform for key, or None"""
+        if not self.enabled:
+            return None
+        fname = self.location(key)
+        try:
+            wave = np.load(fname, allow_pickle=False)
+            utime(fname)  # mark as recently used
+            return wave
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    def put(self, key, wave):
+        """store waveform under key"""
+        if not self.enabled or wave is None:
+            return False
+        fname = self.location(key)
+        temp = f'{fname}.{uuid4()}.tmp'
+        try:
+            Path(path.dirname(fname)).mkdir(parents=True, exist_ok=True)
+            with open(temp, 'wb') as f:
+                np.save(f, np.asarray(wave), allow_pickle=False)
+            replace(temp, fname)
+            self.grow(stat(fname).st_size)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'failed to cache chunk {key}: {err}', log_level=2)
+            if path.exists(temp):
+                remove(temp)
+            return False
+        return True
+
+    def checkout(self, key, target, extension='mp3'):
+        """
+        place the cached encoded audio for key at target
+
+        target is a hard link (or a copy where links are not possible), so it
+        stays intact if the entry is evicted while the caller still needs it
+
+        :return: True if there was a non-empty entry for key
+        """
+        if not self.enabled:
+            return False
+        fname = self.location(key, extension)
+        try:
+            if not stat(fname).st_size:
+                return False
+            utime(fname)  # mark as recently used
+            if path.exists(target):
+                remove(target)
+            try:
+                link(fname, target)
+            except OSError:
+                copyfile(fname, target)
+        except OSError:
+            return False
+        return True
+
+    def put_file(self, key, source, extension='mp3'):
+        """
+        copy a file of encoded audio, such as a downloaded API response, into the cache
+
+        the source is left in place for the caller; empty files are refused
+
+        :return: True if the file was cached
+        """
+        if not self.enabled:
+            return False
+        fname = self.location(key, extension)
+        temp = f'{fname}.{uuid4()}.tmp'
+        try:
+            size = stat(source).st_size
+            if not size:
+                return False
+            Path(path.dirname(fname)).mkdir(parents=True, exist_ok=True)
+            copyfile(source, temp)
+            replace(temp, fname)
+            self.grow(stat(fname).st_size)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'failed to cache chunk {key}: {err}', log_level=2)
+            if path.exists(temp):
+                remove(temp)
+            return False
+        return True
+
+    def fetch(self, key, render):
+        """
+        return cached waveform for key, rendering and storing it on a miss
+
+        :param key: cache key from ChunkCache.key
+        :param render: callable producing the waveform
+        """
+        wave = self.get(key)
+        if wave is not None:
+            self.log.write(f'chunk {key[:12]} retrieved from cache', log_level=3)
+            return wave
+        wave = render()
+        self.put(key, wave)
+        return wave
+
+    def entries(self):
+        """list of (mtime, size, filename) for every cache entry"""
+        results = []
+        for root, _, fnames in walk(self.path):
+            for fname in fnames:
+                if fname.endswith('.tmp'):
+                    continue
+                full = path.join(root, fname)
+                try:
+                    info = stat(full)
+                except OSError:
+                    continue
+                results.append((info.st_mtime, info.st_size, full))
+        return results
+
+    def grow(self, size):
+        """account for a new entry and evict least recently used entries past the cap"""
+        if self.size is None:
+            self.size = sum(x[1] for x in self.entries())
+        else:
+            self.size += size
+        if self.size <= self.max_bytes:
+            return
+        entries = sorted(self.entries())
+        self.size = sum(x[1] for x in entries)
+        for (_, entry_size, fname) in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                remove(fname)
+                self.size -= entry_size
+            except OSError:
+                pass
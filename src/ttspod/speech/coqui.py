@@ -6,9 +6,7 @@ try:
 except ImportError:
     pass
 try:
-    from glob import glob
     from os import path
-    from pathlib import Path
     from pprint import pprint
     from warnings import simplefilter  # disable coqui future warnings
     simplefilter(action='ignore', category=FutureWarning)
@@ -21,9 +19,9 @@ except ImportError as e:
 
 # ttspod modules
 from logger import Logger
+from autotune import ChunkTuner
+from registry import select
 from util import chunk
-from xtts import Xtts
-from tortoise import Tortoise
 
 MODEL = 'xtts'
 
@@ -46,39 +44,34 @@ class Coqui:
             self.log.write('overriding GPU detection, processing on CPU')
             gpu = 'cpu'
         model = model if model else c.get('model', MODEL)
+        self.segmenter = c.get('segmenter', 'spacy')
         voice = voice if voice else c.get('voice')
-        voices = voice
-        voice_dir = None
-        voice_name = None
         if voice:
             voice = path.expanduser(str(voice))
-        if path.isfile(str(voice)):
-            voices = [voice]
-            voice_path = path.dirname(voice)
-            voice_dir = Path(voice_path).parent
-            voice_name = path.basename(voice_path)
-        elif path.isdir(str(voice)):
-            voices = glob(path.join(voice, "*wav"))
-            voice_dir = Path(voice).parent
-            voice_name = path.basename(voice)
-        match model.lower():
-            case 'xtts':
-                self.tts = Xtts(config=self.config,
-                                log=self.log, voices=voices, gpu=gpu)
-            case 'tortoise':
-                self.tts = Tortoise(config=self.config, log=self.log,
-                                    voice_dir=voice_dir, voice_name=voice_name, gpu=gpu)
-            case _:
-                raise ValueError(f'model {model} not available')
+        # the generator class is imported from the backend registry, so only
+        # the selected model's module is loaded
+        backend = select(c.get('engine', 'coqui'), model)
+        if not backend or not backend.generator:
+            raise ValueError(f'model {model} not available')
+        self.tts = backend.load('generator').from_voice(
+            voice=voice, config=self.config, log=self.log, gpu=gpu)
+        self.device = self.tts.device
+        self.model = backend.name
+        self.tuner = ChunkTuner.from_config(config, log=self.log)
 
     def convert(self, text, output_file):
         """convert text input to given output_file"""
-        chunks = chunk(text, min_length=100, max_length=250)
+        (min_length, max_length) = self.tuner.limits(
+            [self.model, self.device, getattr(self.tts, 'batch_size', 1)],
+            self.tts.chunk_sizes, self.tts.probe, default=250)
+        chunks = chunk(text, min_length=min_length, max_length=max_length,
+                       segmenter=self.segmenter)
         self.log.write(
             f'Starting TTS generation on {len(chunks)} chunks of text.', error=False, log_level=3)
-        self.tts.generate(texts=chunks, output=output_file)
-        self.log.write('TTS generation completed.', error=False, log_level=3)
-        return output_file
+        result = self.tts.generate(texts=chunks, output=output_file)
+        self.log.write('TTS generation completed.' if result else 'TTS generation failed.',
+                       error=not result, log_level=3)
+        return result
 
 
 if __name__ == "__main__":
@@ -16,15 +16,11 @@ try:
     from os import path, environ as env
     from platform import processor
     from pprint import pprint
-    from pydub import AudioSegment, silence
-    from transformers import pipeline, pytorch_utils
+    from transformers import pytorch_utils
     from vocos import Vocos
     import numpy as np
-    import soundfile as sf
-    import tempfile
     import torch
     import torchaudio
-    import tqdm
 except ImportError as e:
     print(
         f'Failed to import required module: {e}\n'
@@ -35,6 +31,13 @@ except ImportError as e:
 # ttspod modules
 from logger import Logger
 from util import chunk, patched_isin_mps_friendly
+from autotune import ChunkTuner
+from audio_writer import AudioWriter, SilenceSqueezer
+from checkpoint import Checkpoint
+from chunk_cache import ChunkCache, fingerprint
+from pool import SynthesisPool
+from timing import span
+from voice_cache import VoiceCache
 
 simplefilter(action='ignore', category=FutureWarning)
 
@@ -70,47 +73,15 @@ if "cuda" in DEVICE and torch.cuda.get_device_name().endswith("[ZLUDA]"):
 # cspell: enable
 
 
-def process_voice(ref_audio_orig, ref_text=""):
-    """generate reference text from audio clip for cloning"""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-        audio_clip = AudioSegment.from_file(ref_audio_orig)
-
-        non_silent_segments = silence.split_on_silence(
-            audio_clip, min_silence_len=1000, silence_thresh=-50, keep_silence=1000)
-        audio_clip = AudioSegment.silent(duration=0)
-        for non_silent_segment in non_silent_segments:
-            audio_clip += non_silent_segment
-            if len(audio_clip) > 15000:
-                break
-
-        audio_duration = len(audio_clip)
-        if audio_duration > 20000:
-            audio_clip = audio_clip[:20000]
-        audio_clip.export(f.name, format="wav")
-        ref_audio = f.name
-
-    if not ref_text.strip():
-        pipe = pipeline(
-            "automatic-speech-recognition",
-            model="openai/whisper-large-v3-turbo",
-            torch_dtype=torch.float16 if DEVICE != 'cpu' else torch.float32,
-            device=DEVICE,
-        )
-        ref_text = pipe(
-            ref_audio,
-            chunk_length_s=30,
-            batch_size=128,
-            return_timestamps=False,
-        )["text"].strip()
-    return ref_audio, ref_text
-
-
 class F5:
     """F5 TTS generator"""
 
     def __init__(self, config=None, log=None, voice="") -> None:
         self.log = log if log else Logger(debug=True)
+        self.config = config
         self.log.write('F5 TTS initializing.')
+        self.segmenter = getattr(config, 'segmenter', 'spacy') if config else 'spacy'
+        self.device = DEVICE
         if not voice and isinstance(config, object) and getattr(config, 'voice', ''):
             voice = config.voice
         if path.isdir(voice):
@@ -126,16 +97,17 @@ class F5:
             voice = files('ttspod').joinpath('data', 'sample.wav')
         self.log.write(f'Using voice: {voice}.')
         assert path.exists(voice)  # some voice must be specified
-        # TODO: cache ref_text based on ref_audio
-        # so it doesn't need to be regenerated with every session
-        # could be stored in the pickle file
-        (self.ref_audio, self.ref_text) = preprocess_ref_audio_text(
-            ref_audio_orig=voice,
-            ref_text=""
-        )
-        self.log.write(
-            f'Transcribed {self.ref_audio} to:\n{self.ref_text}.', log_level=3)
-        self.audio, self.sr = torchaudio.load(self.ref_audio)
+        self.cache = ChunkCache.from_config(config, log=self.log)
+        self.voice_id = fingerprint(str(voice))
+        # trimming and transcribing the reference needs an ASR model, so the
+        # result is kept in the voice cache and only computed for new voices
+        self.voice_cache = VoiceCache.from_config(config, log=self.log)
+        key = self.voice_cache.key(MODEL, SAMPLE_RATE, TARGET_RMS, self.voice_id)
+        self.reference = self.voice_cache.fetch(key, lambda: self.process_reference(voice))
+        self.reference['prepared'] = self.reference['prepared'].to(DEVICE)
+        self.ref_text = self.reference['transcript']
+        self.audio = self.reference['audio']
+        self.sr = self.reference['sr']
         self.max_chars = int(len(self.ref_text.encode('utf-8')) /
                              (self.audio.shape[-1] / self.sr) *
                              (25 - self.audio.shape[-1] / self.sr))
@@ -149,11 +121,29 @@ class F5:
                                     ode_method="euler",
                                     use_ema=True,
                                     device=DEVICE)
+        self.pool = SynthesisPool.from_config(self, config, device=DEVICE, log=self.log)
+        self.pool.start()
+        self.tuner = ChunkTuner.from_config(config, log=self.log)
 
-    def infer_batch(self, ref_audio, ref_text, gen_text_batches):
-        """workhorse inference function"""
-        audio, sr = ref_audio
+    def process_reference(self, voice):
+        """trim and transcribe a reference clip, then prepare it for inference"""
+        (ref_audio, ref_text) = preprocess_ref_audio_text(
+            ref_audio_orig=voice,
+            ref_text=""
+        )
+        self.log.write(
+            f'Transcribed {ref_audio} to:\n{ref_text}.', log_level=3)
+        audio, sr = torchaudio.load(ref_audio)
+        reference = self.prepare_reference(audio, sr, ref_text)
+        reference.update(audio=audio, sr=sr, transcript=ref_text)
+        return reference
+
+    def prepare_reference(self, audio, sr, ref_text):
+        """
+        mix down, normalize and resample reference audio and punctuate its transcript
 
+        :return: dictionary with the prepared tensor, original rms and reference text
+        """
         if not ref_text.endswith(". "):
             if ref_text.endswith("."):
                 ref_text += " "
@@ -172,21 +162,87 @@ class F5:
         if sr != SAMPLE_RATE:
             resampler = torchaudio.transforms.Resample(sr, SAMPLE_RATE)
             audio = resampler(audio)
-        audio = audio.to(DEVICE)
+        return {'prepared': audio, 'rms': rms, 'ref_text': ref_text}
+
+    def infer_batch(self, ref_audio, ref_text, gen_text_batches, checkpoint=None, writer=None):
+        """
+        workhorse inference function
+
+        waveforms are streamed into writer when one is given, otherwise the
+        concatenated waveform is returned
+        """
+        checkpoint = checkpoint if checkpoint else Checkpoint()
+        audio, sr = ref_audio
+        if audio is self.audio and ref_text == self.ref_text:
+            reference = self.reference
+        else:
+            reference = self.prepare_reference(audio, sr, ref_text)
+        ref_text = reference['ref_text']
+        rms = reference['rms']
+        audio = reference['prepared'].to(DEVICE)
 
         generated_waves = []
+        # long pauses are shortened before encoding, so the file is written once
+        squeezer = SilenceSqueezer(SAMPLE_RATE)
+        window = self.pool.size * 2
+        for start in range(0, len(gen_text_batches), window):
+            indices = range(start, min(start + window, len(gen_text_batches)))
+            waves = {}
+            pending = []
+            for i in indices:
+                gen_text = gen_text_batches[i]
+                self.log.write(
+                    f'Chunk {i+1} of {len(gen_text_batches)}: {gen_text}', log_level=3)
+                waves[i] = checkpoint.get(i)
+                if waves[i] is None:
+                    key = self.cache.key(MODEL, self.voice_id, ref_text, NFE_STEP, CFG_STRENGTH,
+                                         SWAY_SAMPLING_COEF, SPEED, text=gen_text)
+                    waves[i] = self.cache.get(key)
+                    if waves[i] is None:
+                        pending.append((i, key))
+                        continue
+                    checkpoint.put(i, waves[i])
+            rendered = self.pool.map(
+                'render', [(audio, ref_text, rms, gen_text_batches[i]) for (i, _) in pending])
+            for (i, key), generated_wave in zip(pending, rendered):
+                self.cache.put(key, generated_wave)
+                checkpoint.put(i, generated_wave)
+                waves[i] = generated_wave
+            for i in indices:
+                if writer:
+                    writer.write(squeezer.feed(waves[i]))
+                else:
+                    generated_waves.append(waves[i])
+        if writer:
+            writer.write(squeezer.flush())
+            return None
+        final_wave = np.concatenate(generated_waves)
+        return final_wave
 
-        for i, gen_text in enumerate(tqdm.tqdm(gen_text_batches)):
-            self.log.write(
-                f'Chunk {i+1} of {len(gen_text_batches)}: {gen_text}', log_level=3)
-            final_text_list = [ref_text + gen_text]
-
-            # Calculate duration
-            ref_audio_len = audio.shape[-1] // HOP_LENGTH
-            ref_text_len = len(ref_text.encode('utf-8'))
-            gen_text_len = len(gen_text.encode('utf-8'))
-            duration = ref_audio_len + \
-                int(ref_audio_len / ref_text_len * gen_text_len / SPEED)
+    def probe(self, texts):
+        """render texts against the configured voice, bypassing caches, for the chunk tuner"""
+        audio = self.reference['prepared'].to(DEVICE)
+        return [self.render(audio, self.reference['ref_text'], self.reference['rms'], x)
+                for x in texts]
+
+    def render(self, audio, ref_text, rms, gen_text):
+        """
+        synthesize a single chunk of text into a waveform
+
+        :param audio: prepared reference audio tensor on DEVICE
+        :param ref_text: transcript of the reference audio
+        :param rms: original loudness of the reference audio
+        :param gen_text: text to synthesize
+        """
+        final_text_list = [ref_text + gen_text]
+
+        # Calculate duration
+        ref_audio_len = audio.shape[-1] // HOP_LENGTH
+        ref_text_len = len(ref_text.encode('utf-8'))
+        gen_text_len = len(gen_text.encode('utf-8'))
+        duration = ref_audio_len + \
+            int(ref_audio_len / ref_text_len * gen_text_len / SPEED)
+        with span('synthesis', chunks=1, characters=len(gen_text)) as labels:
             # inference
             with torch.inference_mode():
                 generated, _ = self.ema_model.sample(
@@ -204,30 +260,37 @@ class F5:
             if rms < TARGET_RMS:
                 generated_wave = generated_wave * rms / TARGET_RMS
             generated_wave = generated_wave.squeeze().cpu().numpy()
-            generated_waves.append(generated_wave)
-        final_wave = np.concatenate(generated_waves)
-        return final_wave
+            labels['audio_seconds'] = round(len(generated_wave) / SAMPLE_RATE, 3)
+        return generated_wave
 
     def convert(self, text="", output_file=None):
         """convert text input to given output_file"""
-        chunks = chunk(text=text, min_length=round(
-            self.max_chars/2), max_length=self.max_chars)
-        result = self.infer_batch(
-            (self.audio, self.sr), self.ref_text, chunks)
-        if output_file:
-            try:
-                f = open(output_file, "wb")
-                sf.write(f.name, result, SAMPLE_RATE, format="mp3")
-                audio_segment = AudioSegment.from_file(output_file)
-                non_silent_segments = silence.split_on_silence(
-                    audio_segment, min_silence_len=1000, silence_thresh=-50, keep_silence=500)
-                final_audio = AudioSegment.silent(duration=0)
-                for non_silent_segment in non_silent_segments:
-                    final_audio += non_silent_segment
-                final_audio.export(output_file, format="mp3")
-            except Exception:  # pylint: disable=broad-except
-                self.log.write(
-                    f'Error saving to output_file {output_file}.', error=True, log_level=0)
+        # the longest chunk that fits the model's window next to the reference clip
+        # is the default, shorter ones are tried since they may render faster
+        (min_length, max_length) = self.tuner.limits(
+            ['f5', self.device, self.voice_id[:12], NFE_STEP],
+            [round(self.max_chars * x) for x in (0.5, 0.75, 1.0)],
+            self.probe, default=self.max_chars, ratio=0.5)
+        chunks = chunk(text=text, min_length=min_length, max_length=max_length,
+                       segmenter=self.segmenter)
+        if not output_file:
+            return
+        checkpoint = Checkpoint.from_config(
+            self.config, settings=[MODEL, self.voice_id, self.ref_text, NFE_STEP,
+                                   CFG_STRENGTH, SWAY_SAMPLING_COEF, SPEED],
+            texts=chunks, output=output_file, log=self.log)
+        try:
+            with AudioWriter.from_config(output_file, SAMPLE_RATE, config=self.config,
+                                         log=self.log) as writer:
+                self.infer_batch(
+                    (self.audio, self.sr), self.ref_text, chunks, checkpoint, writer)
+            if writer.close():
+                checkpoint.clear()
+                return output_file
+        except Exception:  # pylint: disable=broad-except
+            self.log.write(
+                f'Error saving to output_file {output_file}.', error=True, log_level=0)
+        return None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+"""MPEG audio layer III frame parsing, for joining MP3 streams without re-encoding"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# bitrates in kbit/s by bitrate index, for MPEG-1 and for MPEG-2/2.5 layer III
+BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+# sample rates by version bits and sample rate index
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000]  # MPEG-2.5
+}
+
+
+def header(data, offset):
+    """
+    decode the frame header at offset
+
+    :return: (frame length in bytes, samples per frame, sample rate, channels),
+             or None if no layer III frame starts there
+    """
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 3
+    layer = (data[offset + 1] >> 1) & 3
+    bitrate_index = data[offset + 2] >> 4
+    rate_index = (data[offset + 2] >> 2) & 3
+    padding = (data[offset + 2] >> 1) & 1
+    channels = 1 if data[offset + 3] >> 6 == 3 else 2
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    samples = 1152 if version == 3 else 576
+    length = samples // 8 * bitrate // sample_rate + padding
+    return (length, samples, sample_rate, channels)
+
+
+def parse(data):
+    """
+    audio frames of an MP3 stream with tags and encoder info frames removed
+
+    an ID3v2 tag, a leading Xing/Info/VBRI frame (which would give players the
+    length of this stream only) and an ID3v1 tag are dropped, so streams with
+    the same sample rate and channel count can simply be concatenated
+
+    :return: dictionary with audio (bytes), seconds, sample_rate and channels,
+             or None if data is not a layer III stream
+    """
+    data = bytes(data)
+    offset = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data) - 128 if data[-128:-125] == b'TAG' else len(data)
+    # tolerate a little junk before the first frame
+    while offset < min(end, 4096) and not header(data, offset):
+        offset += 1
+    frames = []
+    (sample_rate, channels, samples) = (None, None, 0)
+    while offset < end:
+        frame = header(data, offset)
+        if not frame or offset + frame[0] > end:
+            break
+        if sample_rate is None:
+            (sample_rate, channels) = frame[2:]
+            if any(x in data[offset + 4:offset + 40] for x in (b'Xing', b'Info', b'VBRI')):
+                offset += frame[0]
+                continue
+        elif frame[2:] != (sample_rate, channels):
+            return None
+        frames.append(data[offset:offset + frame[0]])
+        samples += frame[1]
+        offset += frame[0]
+    if not frames:
+        return None
+    return {'audio': b''.join(frames), 'frames': len(frames), 'seconds': samples / sample_rate,
+            'sample_rate': sample_rate, 'channels': channels, 'header': frames[0][:4]}
+
+
+def info_frame(first, frames=0, size=0):
+    """
+    Xing frame describing a whole file
+
+    :param first: header bytes of the first audio frame
+    :param frames: number of audio frames
+    :param size: bytes of audio following the Xing frame
+    """
+    mpeg1 = (first[1] >> 3) & 3 == 3
+    mono = first[3] >> 6 == 3
+    # the tag follows the side information, whose size depends on version and mode
+    position = 4 + (17 if mono else 32) if mpeg1 else 4 + (9 if mono else 17)
+    for bitrate_index in range(1, 15):
+        # same version, layer and sample rate, no CRC and no padding
+        head = bytes([0xFF, first[1] | 1, (bitrate_index << 4) | (first[2] & 0x0C), first[3]])
+        length = header(head, 0)[0]
+        if length >= position + 16 and bitrate_index >= first[2] >> 4:
+            break
+    tag = b'Xing' + (3).to_bytes(4, 'big') + frames.to_bytes(4, 'big') + \
+        (length + size).to_bytes(4, 'big')
+    info = head + bytes(position - 4) + tag
+    return info + bytes(length - len(info))
+
+
+class FrameWriter(object):
+    """
+    write MP3 streams of one format to a file frame by frame, in order
+
+    a Xing frame with the total frame and byte counts goes in front once
+    the last stream is in, so players show the right duration and can seek
+    even in variable bitrate audio; nothing is decoded or re-encoded
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.file = open(output, 'wb')  # pylint: disable=consider-using-with
+        self.first = None
+        self.format = None
+        self.frames = 0
+        self.size = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def append(self, stream):
+        """
+        add a stream returned by parse
+
+        :return: False, leaving the file unchanged, if stream is None or of another format
+        """
+        if not stream:
+            return False
+        if self.first is None:
+            self.first = stream['header']
+            self.format = (stream['sample_rate'], stream['channels'])
+            self.file.write(info_frame(self.first))  # placeholder until close
+        elif (stream['sample_rate'], stream['channels']) != self.format:
+            return False
+        self.file.write(stream['audio'])
+        self.frames += stream['frames']
+        self.size += len(stream['audio'])
+        self.seconds += stream['seconds']
+        return True
+
+    def close(self):
+        """fill in the Xing frame and close the file"""
+        if self.file.closed:
+            return
+        if self.first is not None:
+            self.file.seek(0)
+            self.file.write(info_frame(self.first, self.frames, self.size))
+        self.file.close()
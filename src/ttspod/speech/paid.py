@@ -8,14 +8,15 @@ except ImportError:
 
 # standard modules
 try:
-    from concurrent.futures import ThreadPoolExecutor
+    from itertools import chain
     from nltk.tokenize import BlanklineTokenizer
     from pydub import AudioSegment
-    from sys import maxsize
+    from time import perf_counter
     from traceback import format_exc
     import os
     import textwrap
     import warnings
+    import numpy as np
 except ImportError as e:
     print(
         f'Failed to import required module: {e}\n'
@@ -32,13 +33,17 @@ except ImportError:
     pass
 try:
     from elevenlabs.client import ElevenLabs
-    from elevenlabs import save
 except ImportError:
     pass
 
 # ttspod modules
+from audio_writer import AudioWriter
+from chunk_cache import ChunkCache
 from logger import Logger
-from util import get_spacy
+from mp3_frames import FrameWriter, parse
+from scheduler import RateScheduler
+from segmenter import segment
+from timing import TIMER, span
 
 MAX_LENGTH = 4096  # hardcoded maximum value for API-based TTS
 OPENAI_MODEL = 'tts-1'
@@ -62,7 +67,7 @@ class Paid:
             self.c = vars(config)
         else:
             self.c = { }
-        self.nlp = get_spacy()
+        self.segmenter = self.c.get('segmenter', 'spacy')
         self.engine = engine if engine else self.c.get('engine','')
         self.oai_key = openai_key if openai_key else self.c.get('openai_api_key','')
         self.el_key = eleven_key if eleven_key else self.c.get('eleven_api_key','')
@@ -72,9 +77,13 @@ class Paid:
         self.el_voice = eleven_voice if eleven_voice else self.c.get('eleven_voice',ELEVEN_VOICE)
         self.max_workers = max_workers if max_workers else self.c.get('max_workers',MAX_WORKERS)
         self.temp_path = os.path.join(temp_path if temp_path else self.c.get('temp_path','.'),'')
+        self.device = 'api'
+        self.cache = ChunkCache.from_config(self.c, log=self.log)
+        self.scheduler = RateScheduler.from_config(self.c, workers=self.max_workers, log=self.log)
         match self.engine.lower():
             case "openai":
-                self.tts = OpenAI(api_key=self.oai_key)
+                # retries are left to the scheduler, which has to see every 429
+                self.tts = OpenAI(api_key=self.oai_key, max_retries=0)
             case "eleven":
                 self.tts = ElevenLabs(api_key=self.el_key)
             case _:
@@ -98,8 +107,7 @@ class Paid:
                     f"further splitting paragraph of length {len(para)}")
                 sentences = []
                 try:
-                    doc = self.nlp(para)
-                    sentences = [sent.text.strip() for sent in doc.sents]
+                    sentences = segment(para, self.segmenter)
                 except Exception:  # pylint: disable=broad-except
                     pass
                 if not sentences:  # fallback method, simple line wrap
@@ -120,54 +128,158 @@ class Paid:
                 segments.append(para)
         return segments
 
-    def convert(self, text, output_file):
-        """convert text input to given output_file"""
-
-        segments = self.segmentize(text)
+    def download(self, job):
+        """
+        request the audio of one segment and stream it into a temporary file
 
-        try:
+        :param job: (segment index, segment text, temporary file name)
+        :return: (temporary file name, seconds the request took)
+        """
+        (_, text, temp) = job
+        start = perf_counter()
+        # a retry starts the file over
+        with open(temp, 'wb') as f:
             if self.engine == "openai":
-                def tts_function(z):
-                    return self.tts.audio.speech.create(
-                        model=self.oai_model,
-                        voice=self.oai_voice,
-                        input=z
-                    )
+                with self.tts.audio.speech.with_streaming_response.create(
+                    model=self.oai_model,
+                    voice=self.oai_voice,
+                    input=text
+                ) as response:
+                    # the response headers carry the rate limits
+                    self.scheduler.observe(response.headers)
+                    for block in response.iter_bytes():
+                        f.write(block)
             elif self.engine == "eleven":
-                def tts_function(z):
-                    return self.tts.generate(
-                        voice=self.el_voice,
-                        model=self.el_model,
-                        text=z
-                    )
+                response = self.tts.generate(
+                    voice=self.el_voice,
+                    model=self.el_model,
+                    text=text
+                )
+                # a generator of byte chunks, or bytes in older clients
+                for block in [response] if isinstance(response, bytes) else response:
+                    f.write(block)
             else:
                 raise ValueError("No TTS engine configured.")
-            futures = []
-            # TODO - use these hashes to see if any segment has already been transcribed
+        return (temp, perf_counter() - start)
+
+    def convert(self, text, output_file):
+        """
+        convert text input to given output_file
+
+        segments are requested concurrently and streamed to disk as they
+        arrive; the output is assembled in segment order from the files,
+        so audio is written while later requests are still outstanding and
+        at most one segment is held in memory
+        """
+        segments = self.segmentize(text)
+        temp_base = os.path.join(
+            self.temp_path, os.path.splitext(os.path.basename(output_file))[0])
+        temps = []
+        try:
             self.log.write(f'processing {len(segments)} segments')
-            hashes = [str(hash(segment) % ((maxsize + 1) * 2))
-                      for segment in segments]
-            combined = AudioSegment.empty()
-            temp_base = os.path.splitext(os.path.basename(output_file))[0]
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                for future in executor.map(tts_function, segments):
-                    futures.append(future)
-                for i, future in enumerate(futures):
-                    segment_audio = os.path.join(
-                        self.temp_path,
-                        f'{temp_base}-{hashes[i]}.mp3'
-                    )
-                    if self.engine == "openai":
-                        future.stream_to_file(segment_audio)
-                    elif self.engine == "eleven":
-                        save(future, segment_audio)
-                    combined += AudioSegment.from_mp3(segment_audio)
-                combined.export(output_file, format="mp3")
+            # segments already paid for are taken from the cache instead of the API
+            (model, voice) = (self.oai_model, self.oai_voice) if self.engine == "openai" \
+                else (self.el_model, self.el_voice)
+            keys = [self.cache.key(self.engine, model, voice, text=x) for x in segments]
+            temps = [f'{temp_base}-{i}-{x[:12]}.mp3' for (i, x) in enumerate(keys)]
+            # cached segments are linked into temporary files, so entries evicted
+            # while this article is assembled stay available until it is done
+            files = [x if self.cache.checkout(y, x) else None for (x, y) in zip(temps, keys)]
+            pending = [i for (i, x) in enumerate(files) if not x]
+            if len(pending) < len(segments):
+                self.log.write(f'{len(segments) - len(pending)} of {len(segments)} '
+                               'segments retrieved from cache', log_level=2)
+            jobs = [(i, segments[i], temps[i]) for i in pending]
+            seconds = {}
+            results = self.scheduler.map(self.download, jobs,
+                                         [len(segments[i]) for i in pending], ordered=False)
+            # anything but MP3 output is decoded and encoded once at the end
+            writer = FrameWriter(output_file) if output_file.lower().endswith('.mp3') else None
+            copied = 0
+            try:
+                # a final None appends segments that were all in the cache
+                for result in chain(results, [None]):
+                    if result:
+                        (n, (temp, elapsed)) = result
+                        i = jobs[n][0]
+                        files[i] = temp
+                        seconds[i] = elapsed
+                        self.store(keys[i], temp)
+                    # append every segment that is now next in line
+                    while writer and copied < len(files) and files[copied]:
+                        if not self.append(writer, files[copied], segments[copied],
+                                           seconds.get(copied)):
+                            writer.close()
+                            writer = None  # not joinable frame by frame
+                            break
+                        copied += 1
+            finally:
+                results.close()  # stops outstanding requests if assembly failed
+                if writer:
+                    writer.close()
+            if copied < len(files):
+                self.encode(files, output_file)
         except Exception as err:  # pylint: disable=broad-except
             self.log.write(
                 f'TTS engine {self.engine} failed: {err}\n'+format_exc()
             )
+            if os.path.isfile(output_file):
+                os.remove(output_file)  # never leave a partial article behind
+        finally:
+            for temp in temps:
+                if os.path.isfile(temp):
+                    os.remove(temp)
         return True if os.path.isfile(output_file) else False
 
+    def store(self, key, fname):
+        """cache a downloaded segment, unless it is not usable audio"""
+        with open(fname, 'rb') as f:
+            data = f.read()
+        if data and parse(data) is not None:
+            self.cache.put_file(key, fname)
+        else:
+            self.log.write(f'segment {key[:12]} returned no usable audio, not cached',
+                           log_level=2)
+
+    def append(self, writer, fname, text, seconds=None):
+        """
+        add the frames of one segment file to writer
+
+        :param seconds: request time, recorded once the audio length is known,
+                        or None for a segment that came from the cache
+        :return: False if the segment cannot be joined frame by frame
+        """
+        with open(fname, 'rb') as f:
+            stream = parse(f.read())
+        if not writer.append(stream):
+            return False
+        if seconds is not None:
+            TIMER.record('synthesis', seconds, chunks=1, characters=len(text),
+                         audio_seconds=round(stream['seconds'], 3))
+        return True
+
+    def encode(self, files, output_file):
+        """decode every segment file once into PCM and encode the result once"""
+        self.log.write('segments cannot be joined as MP3 frames, re-encoding', log_level=2)
+        writer = None
+        try:
+            with span('encode', encoder='pydub'):
+                for fname in files:
+                    audio = AudioSegment.from_file(fname).set_channels(1)
+                    if writer:
+                        audio = audio.set_frame_rate(writer.sample_rate)
+                    else:
+                        writer = AudioWriter.from_config(output_file, audio.frame_rate,
+                                                         config=self.c, log=self.log)
+                    writer.write(np.array(audio.get_array_of_samples(), dtype=np.float32) /
+                                 (1 << (8 * audio.sample_width - 1)))
+        except Exception:
+            if writer:
+                writer.abort()
+            raise
+        if writer and not writer.close():
+            raise ValueError(f'encoding {output_file} failed')
+
+
 if __name__ == "__main__":
     paid = Paid()
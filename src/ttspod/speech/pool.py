@@ -0,0 +1,128 @@
+"""process pool that shards chunk synthesis across CPU cores"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from multiprocessing import get_all_start_methods, get_context
+    from os import cpu_count
+    import torch
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+from timing import TIMER
+
+# generator shared with forked workers; set just before the pool is created
+ENGINE = None
+
+
+def initialize(threads):
+    """worker start-up: limit torch to its share of the cores"""
+    torch.set_num_threads(threads)
+    # spans inherited from the parent at fork time are not this worker's
+    TIMER.drain()
+    TIMER.local.stack = []
+
+
+def run(job):
+    """worker entry point: call a method of the inherited generator"""
+    (method, args) = job
+    result = getattr(ENGINE, method)(*args)
+    # timing spans recorded here go back to the parent with the result
+    return (result, TIMER.drain())
+
+
+class SynthesisPool(object):
+    """
+    run generator methods in forked worker processes
+
+    the workers are forked from the process that already holds the loaded
+    model, so the weights are shared copy-on-write instead of being loaded
+    once per worker; with a single worker, on a GPU, or where fork is not
+    available, jobs simply run in the calling process
+    """
+
+    def __init__(self, engine, workers=1, threads=0, device='cpu', log=None):
+        self.log = log if log else Logger(debug=True)
+        self.engine = engine
+        self.workers = max(int(workers or 1), 1)
+        self.threads = int(threads or 0) or max((cpu_count() or 1) // self.workers, 1)
+        self.pool = None
+        self.enabled = self.workers > 1
+        if self.enabled and device != 'cpu':
+            self.log.write(
+                f'cpu_workers ignored, synthesis is running on {device}', log_level=2)
+            self.enabled = False
+        if self.enabled and 'fork' not in get_all_start_methods():
+            self.log.write(
+                'cpu_workers ignored, this platform cannot fork worker processes', log_level=2)
+            self.enabled = False
+
+    @classmethod
+    def from_config(cls, engine, config=None, device='cpu', log=None):
+        """build a pool from speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(engine, workers=c.get('cpu_workers', 1), threads=c.get('cpu_threads', 0),
+                   device=device, log=log)
+
+    @property
+    def size(self):
+        """number of jobs that run at once"""
+        return self.workers if self.enabled else 1
+
+    def start(self):
+        """
+        fork the workers once the model and voice are fully loaded
+
+        engines call this at the end of construction: workers forked later,
+        while an AudioWriter is open, would inherit the write end of ffmpeg's
+        input pipe and keep ffmpeg from ever seeing the end of its input
+        """
+        global ENGINE  # pylint: disable=global-statement
+        if self.pool or not self.enabled:
+            return
+        ENGINE = self.engine
+        self.log.write(
+            f'starting {self.workers} synthesis workers '
+            f'with {self.threads} threads each', log_level=2)
+        self.pool = get_context('fork').Pool(
+            self.workers, initializer=initialize, initargs=(self.threads,))
+
+    def map(self, method, jobs):
+        """
+        call method of the generator once per argument tuple in jobs
+
+        :param method: name of the generator method, e.g. 'render'
+        :param jobs: list of argument tuples
+        :return: results in the same order as jobs
+        """
+        jobs = list(jobs)
+        if not self.enabled or len(jobs) < 2:
+            return [getattr(self.engine, method)(*args) for args in jobs]
+        self.start()
+        results = self.pool.map(run, [(method, args) for args in jobs], chunksize=1)
+        for (_, spans) in results:
+            TIMER.merge(spans)
+        return [result for (result, _) in results]
+
+    def close(self):
+        """stop the workers"""
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
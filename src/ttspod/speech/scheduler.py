@@ -0,0 +1,249 @@
+"""rate-limit-aware concurrency for TTS API requests"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from email.utils import parsedate_to_datetime
+    from random import uniform
+    from threading import Condition
+    from time import monotonic, sleep, time
+    import re
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+
+# responses worth repeating: timeouts, conflicts, throttling and server errors
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+BACKOFF = 1.0  # seconds before the first retry, doubled for each further one
+MAX_BACKOFF = 60.0
+
+
+def duration(value):
+    """seconds in a rate-limit reset value such as '20ms', '1.5s' or '6m0s'"""
+    value = str(value).strip().lower()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    return sum(float(x) * scale[unit] for (x, unit) in parts) if parts else None
+
+
+def retry_after(headers):
+    """seconds the server asked to wait, from retry-after-ms or retry-after"""
+    if duration(headers.get('retry-after-ms', '')) is not None:
+        return duration(headers['retry-after-ms']) / 1000
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    seconds = duration(value)
+    if seconds is None:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time()
+        except (TypeError, ValueError):
+            return None
+    return max(seconds, 0.0)
+
+
+def details(err):
+    """
+    HTTP status and headers behind an exception, where there are any
+
+    works with the OpenAI and ElevenLabs client errors as well as urllib's HTTPError
+    """
+    status = getattr(err, 'status_code', None)
+    if status is None and isinstance(getattr(err, 'code', None), int):
+        status = err.code
+    response = getattr(err, 'response', None)
+    if status is None:
+        status = getattr(response, 'status_code', None)
+    headers = getattr(err, 'headers', None) or getattr(response, 'headers', None)
+    return (status, normalize(headers))
+
+
+def normalize(headers):
+    """headers as a dictionary with lower-case names"""
+    try:
+        return {str(x).lower(): y for (x, y) in headers.items()} if headers else {}
+    except AttributeError:
+        return {}
+
+
+def transient(err):
+    """whether an exception without a status is a network failure worth retrying"""
+    name = type(err).__name__
+    return isinstance(err, (ConnectionError, TimeoutError)) or \
+        'Timeout' in name or 'Connection' in name
+
+
+class RateScheduler(object):
+    """
+    run API requests concurrently within the provider's rate limits
+
+    concurrency follows additive increase, multiplicative decrease: every
+    throttled request halves the number of requests in flight and every
+    success raises it by one over the current limit, up to workers; requests
+    that fail with a retryable status or a network error are repeated with
+    jittered exponential backoff (or after the time the server asks for),
+    rate-limit headers that report an exhausted quota pause all requests
+    until it resets, and an optional budget caps the characters sent per window
+
+    :param workers: most requests in flight at once
+    :param retries: attempts per request after the first one
+    :param budget: characters per window, 0 for no limit
+    :param window: length of the budget window in seconds
+    """
+
+    def __init__(self, workers=10, retries=5, budget=0, window=60.0, log=None):
+        self.log = log if log else Logger(debug=True)
+        self.workers = max(int(workers or 1), 1)
+        self.retries = max(int(retries or 0), 0)
+        self.budget = max(int(budget or 0), 0)
+        self.window = float(window)
+        self.limit = float(self.workers)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.sent = deque()  # (monotonic time, characters) within the budget window
+        self.condition = Condition()
+        self.counts = {'requests': 0, 'throttled': 0, 'retried': 0}
+
+    @classmethod
+    def from_config(cls, config=None, workers=None, log=None):
+        """build a scheduler from speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(workers=workers or c.get('max_workers', 10), retries=c.get('paid_retries', 5),
+                   budget=c.get('paid_budget', 0), log=log)
+
+    def acquire(self, cost=0):
+        """wait for a free slot, an unpaused quota and room in the budget"""
+        with self.condition:
+            while True:
+                now = monotonic()
+                wait = self.paused_until - now
+                if wait <= 0 and self.budget:
+                    while self.sent and self.sent[0][0] <= now - self.window:
+                        self.sent.popleft()
+                    used = sum(x for (_, x) in self.sent)
+                    if used and used + cost > self.budget:
+                        wait = self.sent[0][0] + self.window - now
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    self.counts['requests'] += 1
+                    if self.budget:
+                        self.sent.append((now, cost))
+                    return
+                self.condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, throttled=False, succeeded=True):
+        """free a slot and adapt the concurrency limit to the outcome"""
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.counts['throttled'] += 1
+                self.limit = max(self.limit / 2, 1.0)
+            elif succeeded:
+                self.limit = min(self.limit + 1 / self.limit, float(self.workers))
+            self.condition.notify_all()
+
+    def pause(self, seconds):
+        """hold back every request for seconds"""
+        with self.condition:
+            self.paused_until = max(self.paused_until, monotonic() + seconds)
+            self.condition.notify_all()
+
+    def observe(self, headers):
+        """pause until the quota resets when rate-limit headers say it is used up"""
+        headers = normalize(headers)
+        for kind in ('requests', 'tokens'):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            reset = duration(headers.get(f'x-ratelimit-reset-{kind}', ''))
+            try:
+                exhausted = remaining is not None and float(remaining) <= 0
+            except ValueError:
+                continue
+            if exhausted and reset:
+                self.log.write(f'{kind} quota used up, waiting {reset:.1f}s', log_level=2)
+                self.pause(reset)
+
+    def call(self, function, item, cost=0):
+        """call function(item) within the limits, retrying transient failures"""
+        for attempt in range(self.retries + 1):
+            self.acquire(cost)
+            try:
+                result = function(item)
+            except Exception as err:  # pylint: disable=broad-except
+                (status, headers) = details(err)
+                throttled = status == 429
+                self.release(throttled=throttled, succeeded=False)
+                self.observe(headers)
+                if attempt == self.retries or not (
+                        status in RETRY_STATUS or status is None and transient(err)):
+                    raise
+                delay = retry_after(headers)
+                if delay is None:
+                    # full jitter keeps retries of concurrent requests apart
+                    delay = uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt))
+                self.counts['retried'] += 1
+                self.log.write(
+                    f'request failed ({status or type(err).__name__}), retry {attempt + 1} '
+                    f'of {self.retries} in {delay:.1f}s, concurrency {int(self.limit)}',
+                    log_level=2)
+                if throttled:
+                    self.pause(delay)
+                else:
+                    sleep(delay)
+                continue
+            self.release()
+            return result
+        return None
+
+    def map(self, function, items, costs=None, ordered=True):
+        """
+        call function once per item, concurrently within the limits
+
+        :param costs: characters of each item, counted against the budget
+        :param ordered: yield results in the order of items; otherwise yield
+                        (index, result) tuples as soon as each request completes
+        :return: generator of results
+        """
+        items = list(items)
+        costs = list(costs) if costs else [0] * len(items)
+        self.counts = {'requests': 0, 'throttled': 0, 'retried': 0}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.call, function, item, cost): i
+                       for (i, (item, cost)) in enumerate(zip(items, costs))}
+            try:
+                if ordered:
+                    for future in futures:
+                        yield future.result()
+                else:
+                    for future in as_completed(futures):
+                        yield (futures[future], future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        if self.counts['throttled'] or self.counts['retried']:
+            self.log.write(
+                f"{self.counts['requests']} requests, {self.counts['throttled']} throttled, "
+                f"{self.counts['retried']} retried, concurrency settled at {int(self.limit)}",
+                log_level=1)
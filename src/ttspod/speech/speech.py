@@ -23,12 +23,12 @@ except ImportError as e:
 
 # TTSPod modules
 from logger import Logger
+from registry import select
+from timing import span
 from util import check_engines
 
 simplefilter(action='ignore', category=FutureWarning)
 
-ENGINES = check_engines()
-
 
 class Speech(object):
     """main TTS processor"""
@@ -41,26 +41,21 @@ class Speech(object):
         self.final_path = config.final_path
         if dry:
             return
-        # pylint: disable=import-outside-toplevel
-        match self.config.engine.lower():
-            case "openai" if "openai" in ENGINES:
-                from paid import Paid
-                self.tts = Paid(config=self.config, log=self.log)
-            case "eleven" if "eleven" in ENGINES:
-                from paid import Paid
-                self.tts = Paid(config=self.config, log=self.log)
-            case "whisper" if "whisper" in ENGINES:
-                from whisper import Whisper
-                self.tts = Whisper(config=self.config, log=self.log)
-            case "coqui" if "coqui" in ENGINES:
-                from coqui import Coqui
-                self.tts = Coqui(config=self.config, log=self.log)
-            case "f5" if "f5" in ENGINES:
-                from f5 import F5
-                self.tts = F5(config=self.config, log=self.log)
-            case _:
-                raise ValueError('TTS engine not configured')
-        # pylint: enable=import-outside-toplevel
+        # only the selected backend's stack is imported, and only now
+        self.backend = select(self.config.engine, self.config.model)
+        if not self.backend or not self.backend.engine in check_engines():
+            raise ValueError('TTS engine not configured')
+        self.tts = self.backend.create(config=self.config, log=self.log)
+
+    def profile(self):
+        """engine, model, voice and device that audio is being synthesized with"""
+        c = self.config
+        backend = getattr(self, 'backend', None) or select(c.engine, c.model)
+        (model, voice) = backend.label(c) if backend else (c.model, str(c.voice))
+        device = getattr(getattr(self, 'tts', None), 'device', None)
+        return {'engine': c.engine, 'model': model, 'voice': str(voice),
+                'device': str(device or ('cpu' if not c.gpu else 'gpu'))}
+
     def slugify(self, value):
         """convert an arbitrary string to a valid filename"""
         value = str(value)
@@ -89,7 +84,8 @@ class Speech(object):
         self.log.write(f'starting TTS conversion to {out_file}')
         if title != "No Title Available":
             text = title.strip() + ".\n\n" + text.strip()
-        self.log.write(self.tts.convert(text=text, output_file=out_file))
+        with span('speechify', engine=self.config.engine, characters=len(text)):
+            self.log.write(self.tts.convert(text=text, output_file=out_file))
         elapsed = round(time() - start_time)
         self.log.write(
             f'TTS conversion of {out_file} complete, elapsed time: {elapsed} seconds')
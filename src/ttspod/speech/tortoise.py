@@ -7,14 +7,15 @@ except ImportError:
 try:
     from io import StringIO
     from os import path, environ as env
+    from pathlib import Path
     from platform import processor
     from pprint import pprint
     from warnings import simplefilter
     from TTS.api import TTS
     from transformers import pytorch_utils
     from contextlib import redirect_stdout, redirect_stderr
+    import hashlib
     import torch
-    import torchaudio
 except ImportError as e:
     print(
         f'Failed to import required module: {e}\n'
@@ -24,6 +25,10 @@ except ImportError as e:
 
 from util import patched_isin_mps_friendly
 from logger import Logger
+from audio_writer import AudioWriter
+from checkpoint import Checkpoint
+from chunk_cache import ChunkCache, fingerprint
+from timing import span
 
 # suppress spurious FutureWarning from Coqui
 simplefilter(action='ignore', category=FutureWarning)
@@ -36,6 +41,8 @@ MODEL = 'tts_models/en/multi-dataset/tortoise-v2'
 TEMPERATURE = 0.2
 DEVICE = 'cpu'
 PRESET = 'fast'
+# maximum chunk lengths the chunk tuner tries
+CHUNK_SIZES = [100, 150, 200, 250]
 
 if torch.cuda.is_available():
     DEVICE = "cuda"
@@ -56,59 +63,91 @@ if "cuda" in DEVICE and torch.cuda.get_device_name().endswith("[ZLUDA]"):
 class Tortoise:
     """generator for Tortoise model"""
 
+    @classmethod
+    def from_voice(cls, voice=None, config=None, log=None, gpu='gpu'):
+        """build from a voice setting: a wav file or directory inside a voices directory"""
+        (voice_dir, voice_name) = (None, None)
+        if path.isfile(str(voice)):
+            voice_path = path.dirname(voice)
+            voice_dir = Path(voice_path).parent
+            voice_name = path.basename(voice_path)
+        elif path.isdir(str(voice)):
+            voice_dir = Path(voice).parent
+            voice_name = path.basename(voice)
+        return cls(config=config, log=log, voice_dir=voice_dir, voice_name=voice_name, gpu=gpu)
+
     def __init__(self, config=None, log=None, voice_dir=None, voice_name=None, gpu='gpu'):
         self.log = log if log else Logger(debug=True)
         self.config = config
         api = TTS(MODEL, progress_bar=False)
         self.model = api.synthesizer.tts_model
         self.tortoise_config = self.model.config
-        if gpu == 'cpu':
-            self.model.to('cpu')
-        else:
-            self.model.to(DEVICE)
+        self.device = 'cpu' if gpu == 'cpu' else DEVICE
+        self.model.to(self.device)
         self.voice_dir = voice_dir
         self.voice_name = voice_name
-        self.silence = torch.zeros(int(24000*0.5)).unsqueeze(0).cpu()
+        self.chunk_sizes = CHUNK_SIZES
+        self.cache = ChunkCache.from_config(config, log=self.log)
+        voice = path.join(str(voice_dir), str(voice_name)) if voice_dir else voice_name
+        self.voice_id = fingerprint(voice) if self.cache.enabled else str(voice)
+        # the seed decides how the voice sounds, so it is fixed per voice: every
+        # chunk of every article, rendered now or taken from the cache, matches
+        self.seed = int(hashlib.sha256(fingerprint(voice).encode()).hexdigest()[:8], 16)
         self.log.write('Tortoise generator initialized.',
                        error=False, log_level=2)
 
+    def render(self, text):
+        """synthesize a single chunk of text into a waveform"""
+        with span('synthesis', chunks=1, characters=len(text)) as labels:
+            out = self.model.synthesize(
+                text=text,
+                config=self.tortoise_config,
+                speaker_id=self.voice_name,
+                voice_dirs=self.voice_dir,
+                preset=PRESET,
+                use_deterministic_seed=self.seed,
+                return_deterministic_state=True
+            )
+            wave = out['wav'].squeeze().detach().cpu().numpy()
+            labels['audio_seconds'] = round(len(wave) / 24000, 3)
+        return wave
+
+    def probe(self, texts):
+        """render texts one at a time, bypassing caches, for the chunk tuner"""
+        return [self.render(x) for x in texts]
+
     def generate(self, texts=None, output=None):
         """convert a list of texts into an output file"""
-        audio_segments = []
         stdout_buffer = StringIO()
         stderr_buffer = StringIO()
-        seed = None
-        for i, text in enumerate(texts):
-            self.log.write(
-                f'Processing chunk {i+1} of {len(texts)}:\n{text}',
-                error=False,
-                log_level=3)
-            try:
-                with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                    out = self.model.synthesize(
-                        text=text,
-                        config=self.tortoise_config,
-                        speaker_id=self.voice_name,
-                        voice_dirs=self.voice_dir,
-                        preset=PRESET,
-                        use_deterministic_seed=seed,
-                        return_deterministic_state=True
-                    )
-                seed = out['deterministic_seed']
-                audio = out['wav'].squeeze(0).cpu()
-                audio_segments.append(audio)
-                audio_segments.append(self.silence)
-            except Exception as e:  # pylint: disable=broad-except
+        checkpoint = Checkpoint.from_config(
+            self.config, settings=[MODEL, self.voice_id, PRESET, self.seed],
+            texts=texts, output=output, log=self.log)
+        with AudioWriter.from_config(output, 24000, config=self.config, log=self.log) as writer:
+            for i, text in enumerate(texts):
                 self.log.write(
-                    f'Something went wrong processing {text}: {e}', error=True, log_level=0)
-                self.log.write(stdout_buffer.getvalue()+"\n" +
-                               stderr_buffer.getvalue(), error=True, log_level=0)
+                    f'Processing chunk {i+1} of {len(texts)}:\n{text}',
+                    error=False,
+                    log_level=3)
+                try:
+                    wave = checkpoint.get(i)
+                    if wave is None:
+                        key = self.cache.key(MODEL, self.voice_id, PRESET, self.seed, text=text)
+                        with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
+                            wave = self.cache.fetch(
+                                key, lambda text=text: self.render(text))
+                        checkpoint.put(i, wave)
+                    writer.write(wave)
+                    writer.silence(0.5)
+                except Exception as e:  # pylint: disable=broad-except
+                    self.log.write(
+                        f'Something went wrong processing {text}: {e}', error=True, log_level=0)
+                    self.log.write(stdout_buffer.getvalue()+"\n" +
+                                   stderr_buffer.getvalue(), error=True, log_level=0)
         # TODO: print result in case of failure
         _ = stdout_buffer.getvalue()+"\n"+stderr_buffer.getvalue()
-        final_audio = torch.cat(audio_segments, dim=1)
-        torchaudio.save(uri=output, src=final_audio,
-                        sample_rate=24000, format="mp3")
-        if path.isfile(output):
+        if writer.close():
+            checkpoint.clear()
             return output
         else:
             return None
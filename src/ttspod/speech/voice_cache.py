@@ -0,0 +1,108 @@
+"""on-disk store of per-voice conditioning computed from reference audio"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from os import path, remove, replace
+    from pathlib import Path
+    from uuid import uuid4
+    import hashlib
+    import json
+    import torch
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+
+
+class VoiceCache(object):
+    """
+    small store of tensors and strings derived from a voice
+
+    entries are keyed by the voice fingerprint plus the model that produced
+    them, so replacing a reference clip or upgrading the model recomputes
+    """
+
+    def __init__(self, cache_path=None, log=None):
+        self.log = log if log else Logger(debug=True)
+        self.path = cache_path
+        self.enabled = bool(self.path)
+        if self.enabled:
+            try:
+                Path(self.path).mkdir(parents=True, exist_ok=True)
+            except Exception as err:  # pylint: disable=broad-except
+                self.log.write(
+                    f'voice cache disabled, cannot create {self.path}: {err}', True)
+                self.enabled = False
+
+    @classmethod
+    def from_config(cls, config=None, log=None):
+        """build a store from speech settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(cache_path=c.get('voice_cache_path'), log=log)
+
+    @staticmethod
+    def key(*settings):
+        """digest identifying a voice entry, e.g. key(model, version, fingerprint)"""
+        material = json.dumps([str(x) for x in settings])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def location(self, key):
+        """file holding the entry for key"""
+        return path.join(self.path, f'{key}.pth')
+
+    def get(self, key):
+        """return the stored dictionary for key, or None"""
+        if not self.enabled:
+            return None
+        try:
+            return torch.load(self.location(key), map_location='cpu', weights_only=True)
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    def put(self, key, entry):
+        """store a dictionary of tensors, numbers and strings under key"""
+        if not self.enabled or entry is None:
+            return False
+        fname = self.location(key)
+        temp = f'{fname}.{uuid4()}.tmp'
+        try:
+            torch.save({k: v.detach().cpu() if torch.is_tensor(v) else v
+                        for (k, v) in entry.items()}, temp)
+            replace(temp, fname)
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.write(f'failed to cache voice {key}: {err}', log_level=2)
+            if path.exists(temp):
+                remove(temp)
+            return False
+        return True
+
+    def fetch(self, key, compute):
+        """
+        return stored entry for key, computing and storing it on a miss
+
+        :param key: key from VoiceCache.key
+        :param compute: callable returning a dictionary
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self.log.write(f'voice {key[:12]} loaded from cache', log_level=3)
+            return entry
+        entry = compute()
+        self.put(key, entry)
+        return entry
@@ -12,12 +12,12 @@ try:
     from os import path, environ as env
     from pprint import pprint
     import torch
-    import torchaudio
     from pathlib import Path
     from platform import processor
     from transformers import pytorch_utils
     from whisperspeech.pipeline import Pipeline
     from io import StringIO
+    from time import perf_counter
 except ImportError as e:
     print(
         f'Failed to import required module: {e}\n'
@@ -28,6 +28,11 @@ except ImportError as e:
 # ttspod modules
 from logger import Logger
 from util import patched_isin_mps_friendly, chunk
+from autotune import ChunkTuner
+from audio_writer import AudioWriter
+from checkpoint import Checkpoint
+from chunk_cache import ChunkCache, fingerprint
+from timing import TIMER
 
 # suppress spurious UserWarning from Whisper
 simplefilter(action='ignore', category=UserWarning)
@@ -39,6 +44,8 @@ torch.manual_seed(123456789)
 # sensible default settings if none are provided
 DEVICE = 'cpu'
 TEMPERATURE = 0.2
+# maximum lengths of merged chunks the chunk tuner tries
+CHUNK_SIZES = [150, 200, 300, 400]
 
 if torch.cuda.is_available():
     DEVICE = "cuda"
@@ -77,6 +84,8 @@ class Whisper:
             self.gpu = 'cpu'
         else:
             self.gpu = DEVICE
+        self.device = self.gpu
+        self.segmenter = c.get('segmenter', 'spacy')
         t2s_model = c.get(
             'whisper_t2s_model', 'whisperspeech/whisperspeech:t2s-base-en+pl.model')
         s2a_model = c.get(
@@ -89,6 +98,11 @@ class Whisper:
                 glob(path.join(voice, "*mp3"))
             if audio_files:
                 self.voice = audio_files[0]
+        self.t2s_model = t2s_model
+        self.s2a_model = s2a_model
+        self.cache = ChunkCache.from_config(config, log=self.log)
+        self.tuner = ChunkTuner.from_config(config, log=self.log)
+        self.merge_length = 300
         self.tts = Pipeline(t2s_ref=t2s_model,
                             s2a_ref=s2a_model,
                             device=self.gpu,
@@ -97,23 +111,74 @@ class Whisper:
         self.log.write('Whisper generator initialized.',
                        error=False, log_level=2)
 
+    def render(self, text, cps, speaker, old_stoks, old_atoks):
+        """
+        synthesize semantic and acoustic tokens for a single chunk of text
+
+        :param text: text to synthesize
+        :param cps: characters per second
+        :param speaker: speaker embedding
+        :param old_stoks: semantic tokens of the previous chunk, used as a prompt
+        :param old_atoks: acoustic tokens of the previous chunk, used as a prompt
+        """
+        atoks_prompt = None
+        stoks = self.tts.t2s.generate(
+            txt=text,
+            cps=cps,
+            lang='en',
+            T=TEMPERATURE,
+            stoks_prompt=None,
+            show_progress_bar=False
+        )[0]
+        stoks = stoks[stoks != 512]
+        if len(old_stoks) > 0 and len(old_atoks) > 0:
+            stoks = torch.cat([old_stoks[-100:], stoks])
+            atoks_prompt = old_atoks[:, :, -300:]
+        atoks = self.tts.s2a.generate(
+            stoks=stoks,
+            speakers=speaker.unsqueeze(0),
+            atoks_prompt=atoks_prompt,
+            show_progress_bar=False,
+            T=TEMPERATURE
+        )
+        if atoks_prompt is not None:
+            atoks = atoks[:, :, 301:]
+        return stoks, atoks
+
+    def probe(self, texts):
+        """render and vocode texts without prompts or caches, for the chunk tuner"""
+        speaker = self.tts.extract_spk_emb(self.voice) if self.voice \
+            else self.tts.default_speaker
+        empty = torch.empty((0, 0), dtype=float)
+        waves = []
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            for text in texts:
+                (_, atoks) = self.render(text, 15, speaker, empty, empty)
+                waves.append(self.tts.vocoder.decode(atoks).squeeze().cpu().numpy())
+        return waves
+
     def generate(self, texts=None, cps=15, output=None, speaker=None):
         """main whisperspeech generator"""
+        speaker_id = fingerprint(speaker) if self.cache.enabled else str(speaker)
         if not speaker:
             self.log.write('using default speaker')
             speaker = self.tts.default_speaker
         elif isinstance(speaker, (str, Path)):
             self.log.write(f'extracting speaker {speaker}')
             speaker = self.tts.extract_spk_emb(speaker)
-        generated = []
         stdout_buffer = StringIO()
         stderr_buffer = StringIO()
         stoks = torch.empty((0, 0), dtype=float)
         atoks = stoks
         old_stoks = stoks
         old_atoks = stoks
-        atoks_prompt = None
         text = ""
+        previous = ""
+        checkpoint = Checkpoint.from_config(
+            self.config, settings=[self.t2s_model, self.s2a_model, speaker_id, cps, TEMPERATURE],
+            texts=texts, output=output, log=self.log)
+        merged = 0
+        writer = AudioWriter.from_config(output, 24000, config=self.config, log=self.log)
         for i, next_text in enumerate(texts):
             self.log.write(
                 f'Processing chunk {i+1} of {len(texts)}:\n{next_text}',
@@ -121,7 +186,7 @@ class Whisper:
                 log_level=3)
             if i == len(texts)-1:
                 text += f' {next_text}'
-            elif len(text) + len(next_text) < 300:
+            elif len(text) + len(next_text) < self.merge_length:
                 text += f' {next_text}'
                 continue
             if not text:
@@ -129,54 +194,70 @@ class Whisper:
             self.log.write(
                 f'Chunked together as:\n{text}', error=False, log_level=3)
             try:
-                with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                    stoks = self.tts.t2s.generate(
-                        txt=text,
-                        cps=cps,
-                        lang='en',
-                        T=TEMPERATURE,
-                        stoks_prompt=None,
-                        show_progress_bar=False
-                    )[0]
-                    stoks = stoks[stoks != 512]
-                    if len(old_stoks) > 0 and len(old_atoks) > 0:
-                        stoks = torch.cat([old_stoks[-100:], stoks])
-                        atoks_prompt = old_atoks[:, :, -300:]
-                    atoks = self.tts.s2a.generate(
-                        stoks=stoks,
-                        speakers=speaker.unsqueeze(0),
-                        atoks_prompt=atoks_prompt,
-                        show_progress_bar=False,
-                        T=TEMPERATURE
-                    )
-                if atoks_prompt is not None:
-                    atoks = atoks[:, :, 301:]
+                # output depends on the previous chunk through the token prompts
+                settings = [self.t2s_model, self.s2a_model, speaker_id,
+                            cps, TEMPERATURE, previous]
+                stoks_key = self.cache.key('stoks', *settings, text=text)
+                atoks_key = self.cache.key('atoks', *settings, text=text)
+                cached_stoks = checkpoint.get(merged, 'stoks')
+                cached_atoks = checkpoint.get(merged, 'atoks')
+                resumed = cached_stoks is not None and cached_atoks is not None
+                if not resumed:
+                    cached_stoks = self.cache.get(stoks_key)
+                    cached_atoks = self.cache.get(atoks_key)
+                start = perf_counter()
+                rendered = cached_stoks is None or cached_atoks is None
+                if not rendered:
+                    self.log.write('chunk retrieved from cache', log_level=3)
+                    stoks = torch.from_numpy(cached_stoks).to(self.gpu)
+                    atoks = torch.from_numpy(cached_atoks).to(self.gpu)
+                else:
+                    with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
+                        stoks, atoks = self.render(
+                            text, cps, speaker, old_stoks, old_atoks)
+                    self.cache.put(stoks_key, stoks.cpu().numpy())
+                    self.cache.put(atoks_key, atoks.cpu().numpy())
+                if not resumed:
+                    checkpoint.put(merged, stoks.cpu().numpy(), 'stoks')
+                    checkpoint.put(merged, atoks.cpu().numpy(), 'atoks')
                 old_stoks = stoks
                 old_atoks = atoks
-                generated.append(atoks)
+                previous = text
+                # decode right away so audio streams to the encoder chunk by chunk
+                wave = self.tts.vocoder.decode(atoks).squeeze().cpu().numpy()
+                if rendered:
+                    # a chunk spans both token generation and vocoding
+                    TIMER.record('synthesis', perf_counter() - start, chunks=1,
+                                 characters=len(text), audio_seconds=round(len(wave) / 24000, 3))
+                if writer.samples:
+                    writer.silence(0.5)
+                writer.write(wave)
             except Exception as err:  # pylint: disable=broad-except
                 self.log.write(f'Something went wrong: {err}')
                 old_stoks = torch.empty((0, 0), dtype=float)
                 old_atoks = old_stoks
+                previous = ""
+            merged += 1
             text = next_text
         result = stdout_buffer.getvalue()+"\n"+stderr_buffer.getvalue()
-        try:
-            audios = []
-            for i, atok in enumerate(generated):
-                if i != 0:
-                    audios.append(torch.zeros((1, int(24000*0.5)),
-                                              dtype=atok.dtype, device=self.gpu))
-                audios.append(self.tts.vocoder.decode(atok))
-            if output:
-                torchaudio.save(output, torch.cat(audios, -1).cpu(), 24000)
-                if path.isfile(output):
-                    return True
-        except Exception as err:  # pylint: disable=broad-except
-            self.log.write(f'Something went wrong: {err}\n{result}')
+        if writer.close():
+            checkpoint.clear()
+            return True
+        self.log.write(f'Something went wrong: {result}')
 
     def convert(self, text, output_file):
         """convert text input to given output_file"""
-        chunks = chunk(text)
+        if self.tuner.setting == 'off':
+            # built-in segmentation: util.chunk defaults, merged up to 300 characters
+            (min_length, max_length, self.merge_length) = (0, 250, 300)
+        else:
+            # generate merges short chunks up to the same tuned length
+            (min_length, self.merge_length) = self.tuner.limits(
+                ['whisper', self.t2s_model.split(':')[-1], self.device], CHUNK_SIZES,
+                self.probe, default=300, ratio=0.5)
+            max_length = self.merge_length
+        chunks = chunk(text, min_length=min_length, max_length=max_length,
+                       segmenter=self.segmenter)
         try:
             results = self.generate(
                 texts=chunks, output=output_file, speaker=self.voice)
@@ -5,14 +5,16 @@ try:
 except ImportError:
     pass
 try:
-    from os import environ as env
+    from glob import glob
+    from os import path, environ as env
     from platform import processor
     from pprint import pprint
     from warnings import simplefilter
+    from TTS import __version__ as TTS_VERSION
     from TTS.api import TTS
     from transformers import pytorch_utils
+    import numpy as np
     import torch
-    import torchaudio
 except ImportError as e:
     print(
         f'Failed to import required module: {e}\n'
@@ -22,6 +24,12 @@ except ImportError as e:
 
 from util import patched_isin_mps_friendly
 from logger import Logger
+from audio_writer import AudioWriter
+from checkpoint import Checkpoint
+from chunk_cache import ChunkCache, fingerprint
+from pool import SynthesisPool
+from timing import span
+from voice_cache import VoiceCache
 simplefilter(action='ignore', category=FutureWarning)
 
 # this attempts to minimize random voice variations
@@ -32,6 +40,14 @@ MODEL = 'tts_models--multilingual--multi-dataset--xtts_v2'
 TEMPERATURE = 0.2
 DEVICE = 'cpu'
 VOICE = 'Ana Florence'
+# sampling settings used by the model's own inference()
+LENGTH_PENALTY = 1.0
+REPETITION_PENALTY = 10.0
+TOP_K = 50
+TOP_P = 0.85
+BUCKET = 4  # batches worth of upcoming chunks sorted by length together
+# maximum chunk lengths the chunk tuner tries; the tokenizer's limit for English is 250
+CHUNK_SIZES = [100, 150, 200, 250]
 
 if torch.cuda.is_available():
     DEVICE = "cuda"
@@ -52,6 +68,16 @@ if "cuda" in DEVICE and torch.cuda.get_device_name().endswith("[ZLUDA]"):
 class Xtts:
     """generator for XttsV2 model"""
 
+    @classmethod
+    def from_voice(cls, voice=None, config=None, log=None, gpu='gpu'):
+        """build from a voice setting: a wav file, a directory of wav files or a speaker name"""
+        voices = voice
+        if path.isfile(str(voice)):
+            voices = [voice]
+        elif path.isdir(str(voice)):
+            voices = glob(path.join(voice, "*wav"))
+        return cls(config=config, log=log, voices=voices, gpu=gpu)
+
     def __init__(self, config=None, log=None, voices=None, gpu='gpu'):
         self.log = log if log else Logger(debug=True)
         self.config = config
@@ -66,47 +92,220 @@ class Xtts:
         if voices:
             self.voices = voices
         self.model = api.synthesizer.tts_model
-        if gpu == 'cpu':
-            self.model.to('cpu')
-        else:
-            self.model.to(DEVICE)
-        self.silence = torch.zeros(int(24000*0.5))
+        self.device = 'cpu' if gpu == 'cpu' else DEVICE
+        self.model.to(self.device)
         self.speaker_id = None
+        self.cache = ChunkCache.from_config(config, log=self.log)
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        self.batch_size = max(int(c.get('batch_size', 1)), 1)
+        self.chunk_sizes = CHUNK_SIZES
+        self.pool = SynthesisPool.from_config(self, config, device=self.device, log=self.log)
         if not voices:
             voices = VOICE
         # TODO: sanity check voice availability with fallback
+        self.voice_cache = VoiceCache.from_config(config, log=self.log)
         if isinstance(voices, list):
-            self.gpt_cond_latent, self.speaker_embedding = \
-                self.model.get_conditioning_latents(audio_path=self.voices)
+            self.gpt_cond_latent, self.speaker_embedding = self.conditioning(voices)
         elif isinstance(voices, str):
             self.gpt_cond_latent, self.speaker_embedding = \
                 self.model.speaker_manager.speakers[voices].values()
+        self.voice_id = fingerprint(voices) if self.cache.enabled else str(voices)
+        self.pool.start()
         self.log.write('Xtts generator initialized.', error=False, log_level=2)
 
-    def generate(self, texts=None, output=None):
-        """convert a list of texts into an output file"""
-        audio_segments = []
-        for i, text in enumerate(texts):
+    def conditioning(self, clips):
+        """
+        speaker latents for a list of reference clips
+
+        computing them decodes and encodes every clip, so the result is kept
+        in the voice cache keyed by the clips' contents and the model version
+        """
+        key = self.voice_cache.key(MODEL, TTS_VERSION, fingerprint(clips))
+        entry = self.voice_cache.fetch(key, lambda: dict(zip(
+            ['gpt_cond_latent', 'speaker_embedding'],
+            self.model.get_conditioning_latents(audio_path=clips))))
+        return (entry['gpt_cond_latent'].to(self.device),
+                entry['speaker_embedding'].to(self.device))
+
+    def warm(self, voice_path):
+        """
+        precompute latents for every voice under voice_path
+
+        :param voice_path: directory holding one folder of clips, or one clip, per voice
+        """
+        for entry in sorted(glob(path.join(voice_path, '*'))):
+            if path.isdir(entry):
+                clips = glob(path.join(entry, '*wav')) + glob(path.join(entry, '*mp3'))
+            elif entry.lower().endswith(('wav', 'mp3')):
+                clips = [entry]
+            else:
+                continue
+            if clips:
+                self.log.write(f'preparing voice {entry}', log_level=2)
+                self.conditioning(sorted(clips))
+
+    def render(self, text):
+        """synthesize a single chunk of text into a waveform"""
+        out = self.model.inference(
+            text=text,
+            language="en",  # TODO configure or detect language
+            gpt_cond_latent=self.gpt_cond_latent,
+            speaker_embedding=self.speaker_embedding,
+            temperature=TEMPERATURE,
+            enable_text_splitting=True
+        )
+        return np.asarray(out["wav"], dtype=np.float32)
+
+    def render_batch(self, texts):
+        """
+        synthesize several chunks of text together
+
+        token sequences are padded with the stop token, as in training, so the
+        GPT and the HiFi-GAN decoder each run once for the whole batch; returns
+        one waveform per text
+        """
+        gpt = self.model.gpt
+        device = self.model.device
+        tokens = [self.model.tokenizer.encode(x.strip().lower(), lang='en') for x in texts]
+        text_inputs = torch.full((len(tokens), max(len(x) for x in tokens)),
+                                 gpt.stop_text_token, dtype=torch.int32, device=device)
+        for i, token in enumerate(tokens):
+            text_inputs[i, :len(token)] = torch.tensor(token, dtype=torch.int32)
+        text_lengths = torch.tensor([len(x) for x in tokens], device=device)
+        cond_latents = self.gpt_cond_latent.to(device).expand(len(tokens), -1, -1)
+        with torch.no_grad():
+            codes = gpt.generate(
+                cond_latents=cond_latents,
+                text_inputs=text_inputs,
+                do_sample=True,
+                top_p=TOP_P,
+                top_k=TOP_K,
+                temperature=TEMPERATURE,
+                num_return_sequences=1,
+                num_beams=1,
+                length_penalty=LENGTH_PENALTY,
+                repetition_penalty=REPETITION_PENALTY,
+                output_attentions=False
+            )
+            # each row runs up to and including its first stop token, as in inference()
+            stops = codes == gpt.stop_audio_token
+            lengths = torch.where(stops.any(dim=1), stops.int().argmax(dim=1) + 1,
+                                  torch.full_like(text_lengths, codes.shape[-1]))
+            latents = gpt(
+                text_inputs,
+                text_lengths,
+                codes,
+                lengths * gpt.code_stride_len,
+                cond_latents=cond_latents,
+                return_attentions=False,
+                return_latent=True
+            )
+            waves = self.model.hifigan_decoder(
+                latents, g=self.speaker_embedding.to(device)).cpu()
+        scale = waves.shape[-1] / latents.shape[1]
+        offset = latents.shape[1] - codes.shape[-1]
+        return [
+            waves[i].reshape(-1)[:int((int(lengths[i]) + offset) * scale)].numpy()
+            for i in range(len(texts))
+        ]
+
+    def render_group(self, texts):
+        """render a group of chunks, batched when possible"""
+        with span('synthesis', chunks=len(texts),
+                  characters=sum(len(x) for x in texts)) as labels:
+            waves = None
+            if len(texts) > 1:
+                try:
+                    waves = self.render_batch(texts)
+                except Exception as err:  # pylint: disable=broad-except
+                    self.log.write(
+                        f'batched synthesis failed, rendering chunks one at a time: {err}',
+                        log_level=1)
+            if waves is None:
+                waves = [self.render(x) for x in texts]
+            labels['audio_seconds'] = round(sum(len(x) for x in waves) / 24000, 3)
+            return waves
+
+    def probe(self, texts):
+        """render texts batch_size at a time, bypassing caches, for the chunk tuner"""
+        return [wave for n in range(0, len(texts), self.batch_size)
+                for wave in self.render_group(texts[n:n+self.batch_size])]
+
+    def prepare(self, texts, indices, checkpoint):
+        """
+        return waveforms for the given chunk indices
+
+        chunks found in the checkpoint or cache are reused; the rest are sorted
+        by length and rendered batch_size at a time, spread over the CPU workers
+        """
+        waves = {}
+        pending = []
+        limit = self.model.tokenizer.char_limits.get('en', 250)
+        for i in indices:
             self.log.write(
-                f'Processing chunk {i+1} of {len(texts)}:\n{text}',
+                f'Processing chunk {i+1} of {len(texts)}:\n{texts[i]}',
                 error=False,
                 log_level=3)
-            out = self.model.inference(
-                text=text,
-                language="en",  # TODO configure or detect language
-                gpt_cond_latent=self.gpt_cond_latent,
-                speaker_embedding=self.speaker_embedding,
-                temperature=TEMPERATURE,
-                enable_text_splitting=True
-            )
-            audio_segments.append(torch.tensor(out["wav"]).unsqueeze(0))
-            audio_segments.append(self.silence.unsqueeze(0))
-        final_audio = torch.cat(audio_segments, dim=1)
-        torchaudio.save(output, final_audio, 24000, format="mp3")
-        # TODO sanity check that it actually worked
+            wave = checkpoint.get(i)
+            if wave is None:
+                key = self.cache.key(MODEL, self.voice_id, TEMPERATURE, "en", text=texts[i])
+                wave = self.cache.get(key)
+                if wave is None:
+                    pending.append((i, key))
+                    continue
+                self.log.write(f'chunk {key[:12]} retrieved from cache', log_level=3)
+                checkpoint.put(i, wave)
+            waves[i] = wave
+        # chunks the model would split into sentences itself go through inference()
+        batchable = sorted([x for x in pending if len(texts[x[0]]) <= limit],
+                           key=lambda x: len(texts[x[0]]))
+        groups = [batchable[n:n+self.batch_size]
+                  for n in range(0, len(batchable), self.batch_size)]
+        groups += [[x] for x in pending if len(texts[x[0]]) > limit]
+        results = self.pool.map(
+            'render_group', [([texts[i] for (i, _) in group],) for group in groups])
+        for group, rendered in zip(groups, results):
+            for (i, key), wave in zip(group, rendered):
+                self.cache.put(key, wave)
+                checkpoint.put(i, wave)
+                waves[i] = wave
+        return waves
+
+    def generate(self, texts=None, output=None):
+        """convert a list of texts into an output file"""
+        checkpoint = Checkpoint.from_config(
+            self.config, settings=[MODEL, self.voice_id, TEMPERATURE],
+            texts=texts, output=output, log=self.log)
+        window = self.batch_size * self.pool.size
+        window = window * BUCKET if window > 1 else 1
+        with AudioWriter.from_config(output, 24000, config=self.config, log=self.log) as writer:
+            for start in range(0, len(texts), window):
+                indices = range(start, min(start + window, len(texts)))
+                waves = self.prepare(texts, indices, checkpoint)
+                for i in indices:
+                    writer.write(waves[i])
+                    writer.silence(0.5)
+        if writer.close():
+            checkpoint.clear()
+            return output
+        return None
 
 
 if __name__ == "__main__":
+    from sys import argv
+    if len(argv) > 1:
+        # precompute latents for voice folders, e.g. examples/voices/xtts
+        from config import Config
+        settings = Config(engine='coqui', model='xtts')
+        xtts = Xtts(config=settings.speech, log=settings.log)
+        for voice_folder in argv[1:]:
+            xtts.warm(voice_folder)
+        exit()
     xtts = Xtts()
     print("This is the TTSPod XTTS TTS module.")
     pprint(vars(xtts))
@@ -0,0 +1,147 @@
+"""real-time-factor history of TTS conversions"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from datetime import datetime, timedelta
+    from os import path
+    from pathlib import Path
+    import json
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# TTSPod modules
+from logger import Logger
+
+# fields a synthesis setup is identified by
+PROFILE = ['engine', 'model', 'voice', 'device']
+
+
+class Stats(object):
+    """
+    per-chunk synthesis measurements appended to a JSON lines history
+
+    each line records characters in, audio seconds out and wall seconds
+    spent on one synthesized chunk (or batch of chunks), tagged with engine,
+    model, voice and device; chunks served from a cache are not recorded
+    """
+
+    def __init__(self, history_path=None, log=None):
+        self.log = log if log else Logger(debug=True)
+        self.path = history_path
+
+    @classmethod
+    def from_config(cls, config=None, log=None):
+        """build from main settings (object or dict)"""
+        if not config:
+            c = {}
+        elif isinstance(config, dict):
+            c = config
+        else:
+            c = vars(config)
+        return cls(history_path=c.get('stats_path'), log=log)
+
+    def add(self, profile, spans, title=None):
+        """
+        append synthesis spans of one conversion to the history
+
+        :param profile: dictionary with the PROFILE fields
+        :param spans: synthesis spans from timing, carrying characters and audio_seconds
+        :param title: title of the converted item
+        :return: totals of the conversion, or None if nothing was synthesized
+        """
+        when = datetime.now().isoformat(timespec='seconds')
+        records = [{'time': when, **{x: str(profile.get(x, '')) for x in PROFILE},
+                    'title': title, 'chunks': x.get('chunks', 1),
+                    'characters': x['characters'], 'audio_seconds': x['audio_seconds'],
+                    'seconds': x['seconds']}
+                   for x in spans if x.get('audio_seconds') and 'characters' in x]
+        if not records:
+            return None
+        totals = self.totals(records)
+        self.log.write(
+            f"synthesized {totals['audio_seconds']:.0f}s of audio from "
+            f"{totals['characters']} characters in {totals['seconds']:.0f}s, "
+            f"real-time factor {totals['rtf']:.2f}", log_level=1)
+        if self.path:
+            try:
+                Path(path.dirname(self.path) or '.').mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(x) + '\n' for x in records)
+            except Exception as err:  # pylint: disable=broad-except
+                self.log.write(f'failed saving stats to {self.path}: {err}', True)
+        return totals
+
+    def load(self, days=None):
+        """records in the history, optionally only those of the last days"""
+        if not self.path or not path.isfile(self.path):
+            return []
+        since = (datetime.now() - timedelta(days=days)).isoformat() if days else ''
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # tolerate a line cut short by an interrupted run
+                if record.get('time', '') >= since:
+                    records.append(record)
+        return records
+
+    @staticmethod
+    def totals(records):
+        """summed measurements of records with derived rates"""
+        result = {
+            'chunks': sum(x.get('chunks', 1) for x in records),
+            'characters': sum(x['characters'] for x in records),
+            'audio_seconds': sum(x['audio_seconds'] for x in records),
+            'seconds': sum(x['seconds'] for x in records)
+        }
+        result['rtf'] = result['seconds'] / result['audio_seconds'] \
+            if result['audio_seconds'] else 0.0
+        result['characters_per_second'] = result['characters'] / result['seconds'] \
+            if result['seconds'] else 0.0
+        return result
+
+    def summarize(self, days=None):
+        """
+        totals grouped by month and synthesis profile
+
+        real-time factor is wall seconds per second of audio, so values
+        below 1 are faster than real time
+        """
+        groups = {}
+        for record in self.load(days):
+            key = (record['time'][:7],) + tuple(record.get(x, '') for x in PROFILE)
+            groups.setdefault(key, []).append(record)
+        return [{'month': key[0], **dict(zip(PROFILE, key[1:])), **self.totals(records)}
+                for (key, records) in sorted(groups.items())]
+
+    def report(self, days=None):
+        """summary table as text"""
+        rows = self.summarize(days)
+        if not rows:
+            return f'no synthesis history found in {self.path}'
+        voices = [path.basename(x['voice'].rstrip('/\\')) or x['voice'] for x in rows]
+        width = max([len(x) for x in voices] + [5])
+        model_width = max([len(x['model']) for x in rows] + [5])
+        lines = [f"{'month':<8}{'engine':<9}{'model':<{model_width+2}}"
+                 f"{'voice':<{width+2}}{'device':<8}"
+                 f"{'chunks':>8}{'chars':>10}{'audio s':>10}{'wall s':>10}"
+                 f"{'chars/s':>9}{'RTF':>7}"]
+        for (row, voice) in zip(rows, voices):
+            lines.append(
+                f"{row['month']:<8}{row['engine']:<9}{row['model']:<{model_width+2}}"
+                f"{voice:<{width+2}}{row['device']:<8}{row['chunks']:>8}"
+                f"{row['characters']:>10}{row['audio_seconds']:>10.0f}{row['seconds']:>10.0f}"
+                f"{row['characters_per_second']:>9.1f}{row['rtf']:>7.2f}")
+        return '\n'.join(lines)
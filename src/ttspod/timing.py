@@ -0,0 +1,199 @@
+"""lightweight per-stage timing spans with JSON lines and Prometheus export"""
+# optional system certificate trust
+try:
+    import truststore
+    truststore.inject_into_ssl()
+except ImportError:
+    pass
+
+# standard modules
+try:
+    from contextlib import contextmanager
+    from functools import wraps
+    from os import getpid, path, replace
+    from pathlib import Path
+    from threading import Lock, local
+    from time import perf_counter, time
+    from uuid import uuid4
+    import json
+except ImportError as e:
+    print(
+        f'Failed to import required module: {e}\n'
+        'You may need to re-execute quickstart.sh.\n'
+        'See https://github.com/ajkessel/ttspod/blob/main/README.md for details.')
+    exit()
+
+# optional modules
+try:
+    from os import register_at_fork
+except ImportError:  # platforms without fork
+    register_at_fork = None
+
+
+class Timer(object):
+    """
+    collect timing spans for the stages of a run
+
+    spans are kept in memory until flush, which appends them as JSON lines to
+    span_log and rewrites metrics_file, a Prometheus textfile-collector file
+    with per-stage totals for the life of the process; nothing is written
+    when neither is configured, so timing costs a perf_counter call per span
+    """
+
+    def __init__(self, span_log=None, metrics_file=None, log=None):
+        self.log = log
+        self.span_log = span_log
+        self.metrics_file = metrics_file
+        self.run = uuid4().hex[:12]
+        self.spans = []
+        self.totals = {}
+        self.lock = Lock()
+        self.local = local()
+        # a process forked while another thread records a span (e.g. synthesis
+        # workers forked while ingest runs) would inherit the lock held forever
+        if register_at_fork:
+            register_at_fork(before=self.lock.acquire, after_in_parent=self.lock.release,
+                             after_in_child=self.lock.release)
+
+    def configure(self, span_log=None, metrics_file=None, log=None):
+        """set export destinations once settings are known"""
+        self.span_log = span_log or None
+        self.metrics_file = metrics_file or None
+        if log:
+            self.log = log
+
+    def record(self, stage, seconds, start=None, **labels):
+        """add a span measured elsewhere, e.g. in a background thread"""
+        entry = {'run': self.run, 'stage': stage,
+                 'start': round(start if start is not None else time() - seconds, 6),
+                 'seconds': round(seconds, 6), 'pid': getpid()}
+        parents = getattr(self.local, 'stack', None)
+        if parents:
+            entry['parent'] = parents[-1]
+        entry.update(labels)
+        with self.lock:
+            self.spans.append(entry)
+            (total, count) = self.totals.get(stage, (0.0, 0))
+            self.totals[stage] = (total + seconds, count + 1)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """
+        time the enclosed block as one span of stage
+
+        extra keyword arguments are stored with the span, e.g. source='wallabag';
+        the block receives them as a dictionary and may add results to it, e.g.
+        labels['audio_seconds'], which are recorded when the block exits
+        """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(stage)
+        started = time()
+        start = perf_counter()
+        try:
+            yield labels
+        finally:
+            seconds = perf_counter() - start
+            self.local.stack.pop()
+            self.record(stage, seconds, started, **labels)
+
+    def timed(self, stage):
+        """decorator recording every call of a function as a span of stage"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def iterate(self, items, stage, **labels):
+        """
+        yield from items, recording the time spent producing each one
+
+        for lazy input sources, whose work happens as they are consumed
+        """
+        if items is None:
+            return
+        iterator = iter(items)
+        while True:
+            with self.span(stage, **labels):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def mark(self):
+        """position in the pending spans, for use with since"""
+        with self.lock:
+            return len(self.spans)
+
+    def since(self, mark, stage=None):
+        """spans recorded after mark, optionally only those of stage"""
+        with self.lock:
+            return [x for x in self.spans[mark:] if stage is None or x['stage'] == stage]
+
+    def drain(self):
+        """remove and return the spans recorded so far"""
+        with self.lock:
+            (spans, self.spans) = (self.spans, [])
+            return spans
+
+    def merge(self, spans):
+        """add spans recorded in another process, e.g. a synthesis worker"""
+        with self.lock:
+            for entry in spans:
+                entry['run'] = self.run
+                self.spans.append(entry)
+                (total, count) = self.totals.get(entry['stage'], (0.0, 0))
+                self.totals[entry['stage']] = (total + entry['seconds'], count + 1)
+
+    def metrics(self):
+        """per-stage totals in Prometheus text exposition format"""
+        with self.lock:
+            totals = sorted(self.totals.items())
+        lines = [
+            '# HELP ttspod_stage_seconds_total Wall-clock seconds spent in each TTSPod stage.',
+            '# TYPE ttspod_stage_seconds_total counter'
+        ]
+        lines += [f'ttspod_stage_seconds_total{{stage="{stage}"}} {total:.6f}'
+                  for (stage, (total, _)) in totals]
+        lines += [
+            '# HELP ttspod_stage_spans_total Number of spans recorded for each TTSPod stage.',
+            '# TYPE ttspod_stage_spans_total counter'
+        ]
+        lines += [f'ttspod_stage_spans_total{{stage="{stage}"}} {count}'
+                  for (stage, (_, count)) in totals]
+        lines += [
+            '# HELP ttspod_last_flush_timestamp_seconds Time the metrics were last written.',
+            '# TYPE ttspod_last_flush_timestamp_seconds gauge',
+            f'ttspod_last_flush_timestamp_seconds {time():.3f}'
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """write pending spans and current totals to the configured destinations"""
+        spans = self.drain()
+        try:
+            if self.span_log and spans:
+                Path(path.dirname(self.span_log) or '.').mkdir(parents=True, exist_ok=True)
+                with open(self.span_log, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(x) + '\n' for x in spans)
+            if self.metrics_file:
+                Path(path.dirname(self.metrics_file) or '.').mkdir(parents=True, exist_ok=True)
+                # the textfile collector must never see a partial file
+                temp = f'{self.metrics_file}.{getpid()}.tmp'
+                with open(temp, 'w', encoding='utf-8') as f:
+                    f.write(self.metrics())
+                replace(temp, self.metrics_file)
+        except Exception as err:  # pylint: disable=broad-except
+            if self.log:
+                self.log.write(f'failed writing timing data: {err}', True)
+            return False
+        return True
+
+
+# process-wide timer shared by every module
+TIMER = Timer()
+span = TIMER.span
+timed = TIMER.timed
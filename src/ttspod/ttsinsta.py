@@ -55,6 +55,8 @@ class TTSInsta(object):
         """
         retrieve items matching tag
 
+        bookmark text is fetched lazily as entries are consumed
+
         :param tag: tag name to retrieve or ALL for no filtering
         """
         if not self.p:
@@ -64,15 +66,20 @@ class TTSInsta(object):
         if not bookmarks:
             self.log.write(f"No folder or tags found for {tag}")
             return []
-        entries = []
+        return self.fetch_items(bookmarks)
+
+    def fetch_items(self, bookmarks):
+        """
+        generate entries for bookmarks, retrieving text one bookmark at a time
+
+        :param bookmarks: list of instapaper bookmarks
+        """
         for bookmark in bookmarks:
             self.log.write(
                 f'Instapaper content for {bookmark.title} / {bookmark.url}:\n{bookmark.text}',
                 log_level=3
             )
-            entries.append((bookmark.title, clean_text(
-                bookmark.text), bookmark.url))
-        return entries
+            yield (bookmark.title, clean_text(bookmark.text), bookmark.url)
 
     def filter_items(self, tag):
         """
@@ -33,11 +33,9 @@ class TTSPocket(object):
                                    self.config.access_token)
 
     def get_items(self, tag):
-        """generate list of entries from pocket feed"""
+        """generate entries from pocket feed, fetching each link as it is consumed"""
         results = self.p.retrieve(detailType='complete', tag=tag)
         items = results['list']
         urls = [items[x]['resolved_url'] for x in results['list']]
-        entries = []
         for url in urls:
-            entries.extend(self.links.get_items(url))
-        return entries
+            yield from self.links.get_items(url)
@@ -9,19 +9,19 @@ except ImportError:
 try:
     from anyascii import anyascii
     from html import unescape
-    from html2text import html2text
     from importlib import reload
     from importlib.util import find_spec
-    import spacy
-    import enchant
-    from os import path
+    from os import path, replace, stat
+    from pathlib import Path
     from platform import platform
-    from pypandoc import convert_text
     from sys import executable
     # from textwrap import wrap
     from unidecode import unidecode
+    import hashlib
+    import json
     import re
     import subprocess
+    import sys
 except ImportError as e:
     print(
         f'Failed to import required module: {e}\n'
@@ -30,9 +30,21 @@ except ImportError as e:
     exit()
 
 import version
+from registry import backends
+from segmenter import segment
+from timing import timed
+
+# spacy, enchant, pypandoc and html2text are slow to import and only needed
+# once text is actually processed, so they are imported on first use to keep
+# commands such as --sync and --version fast
 
 OS = None
-DICTIONARY = enchant.Dict("en_US")
+ENGINE_CACHE = path.join(Path.home(), '.cache', 'ttspod', 'engines.json')
+AVAILABLE_ENGINES = None  # result of check_engines, computed once per process
+NORMALIZER = None  # compiled clean_text rules, built on first use by get_normalizer
+NLP = None  # spacy pipeline, loaded on first use by get_spacy
+# components of en_core_web_lg that sentence segmentation does not depend on
+SPACY_EXCLUDE = ['tagger', 'attribute_ruler', 'lemmatizer', 'ner']
 
 my_platform = platform().lower()
 if "windows" in my_platform:
@@ -58,57 +70,83 @@ else:
 # pylint: disable=c-extension-no-member
 
 
+def environment_fingerprint() -> str:
+    """
+    digest identifying the set of installed packages
+
+    installing or removing a package changes the modification time of the
+    directory it lives in, so the interpreter plus the modification times of
+    every import path entry is enough to notice without reading metadata
+    """
+    entries = [executable, version.__version__]
+    for entry in sys.path:
+        try:
+            entries.append(f'{entry}:{stat(entry or ".").st_mtime_ns}')
+        except OSError:
+            continue
+    return hashlib.sha256('\n'.join(entries).encode('utf-8')).hexdigest()
+
+
 def check_engines() -> dict:
-    """try importing various TTS modules to determine what is available"""
-    # optional modules - disable linting since we are checking if modules exist
-    # pylint: disable=unused-import,invalid-name,import-outside-toplevel
-    ENGINES = {}
-    try:
-        from elevenlabs.client import ElevenLabs
-        from elevenlabs import save
-        ENGINES['eleven'] = True
-    except ImportError:
-        pass
-    try:
-        from whisperspeech.pipeline import Pipeline
-        ENGINES['whisper'] = True
-    except ImportError:
-        pass
-    try:
-        import f5_tts
-        ENGINES['f5'] = True
-    except ImportError:
-        pass
+    """
+    determine which TTS engines are installed
+
+    engines come from the backend registry, whose packages are located with
+    find_spec rather than imported; the result is cached on disk against
+    environment_fingerprint, so engine stacks (torch, transformers and so
+    on) are only imported by the engine that is actually selected, once
+    synthesis starts
+    """
+    global AVAILABLE_ENGINES  # pylint: disable=global-statement
+    if AVAILABLE_ENGINES is not None:
+        return AVAILABLE_ENGINES
+    fingerprint = environment_fingerprint()
     try:
-        from TTS.api import TTS
-        ENGINES['coqui'] = True
-    except ImportError:
+        with open(ENGINE_CACHE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('fingerprint') == fingerprint:
+            AVAILABLE_ENGINES = cached['engines']
+            return AVAILABLE_ENGINES
+    except Exception:  # pylint: disable=broad-except
         pass
+    AVAILABLE_ENGINES = {x.engine: True for x in backends().values() if x.available()}
     try:
-        from openai import OpenAI
-        ENGINES['openai'] = True
-    except ImportError:
-        pass
-    # pylint: enable=unused-import
-    return ENGINES
+        Path(path.dirname(ENGINE_CACHE)).mkdir(parents=True, exist_ok=True)
+        temp = f'{ENGINE_CACHE}.{fingerprint[:12]}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'engines': AVAILABLE_ENGINES}, f)
+        replace(temp, ENGINE_CACHE)
+    except Exception:  # pylint: disable=broad-except
+        pass  # an unwritable cache only costs a few find_spec calls next time
+    return AVAILABLE_ENGINES
 
 
 def get_spacy():
-    """retrieve model for spacy tokenizer"""
-    nlp = None
-    if not spacy.util.is_package("en_core_web_lg"):
-        spacy.cli.download("en_core_web_lg")
-    nlp = spacy.load("en_core_web_lg")
-    nlp.add_pipe('sentencizer')
-    return nlp
-
+    """
+    retrieve model for spacy tokenizer
 
-def chunk(text=None, min_length=0, max_length=250) -> list[str]:
+    the model is loaded once per process with only the pipes sentence
+    boundaries come from (tok2vec and the parser, with the sentencizer as
+    fallback) and shared by every caller
+    """
+    global NLP  # pylint: disable=global-statement
+    if NLP is None:
+        import spacy  # pylint: disable=import-outside-toplevel
+        if not spacy.util.is_package("en_core_web_lg"):
+            spacy.cli.download("en_core_web_lg")
+        NLP = spacy.load("en_core_web_lg", exclude=SPACY_EXCLUDE)
+        NLP.add_pipe('sentencizer')
+    return NLP
+
+
+@timed('chunk')
+def chunk(text=None, min_length=0, max_length=250, segmenter='spacy') -> list[str]:
     """
     chunk text into segments for speechifying
 
     :param text: text to split into chunks
     :param max_length: maximum length of each chunk
+    :param segmenter: sentence segmenter backend, 'spacy' or 'rules'
     """
     assert min_length < max_length, \
         "Invalid arguments given to chunk function:" \
@@ -116,9 +154,8 @@ def chunk(text=None, min_length=0, max_length=250) -> list[str]:
 
     # TODO: add extra silence for paragraph breaks
     text = text.strip()
-    nlp = get_spacy()
-    doc = nlp(text)
-    sentences = [sent.text.strip() for sent in doc.sents]
+    # segmented paragraph by paragraph so long articles stay under nlp.max_length
+    sentences = segment(text, segmenter)
     if not sentences:
         return []
     chunks = []
@@ -249,6 +286,10 @@ def clean_html(raw_html):
 
     :param raw_html: unprocessed HTML content to strip of tags and other cruft
     """
+    # pylint: disable=import-outside-toplevel
+    from html2text import html2text
+    from pypandoc import convert_text
+    # pylint: enable=import-outside-toplevel
     text = None
     try:
         text = convert_text(
@@ -282,20 +323,25 @@ def fix_path(text, trail=False):
     return fixed_text
 
 
-def clean_text(text):
-    """remove as much non-speakable text as possible"""
-    if not isinstance(text, str):
-        text = text.decode('utf-8', 'ignore')
-    text = unescape(text)
-    # remove obvious hyperlinks
-    text = re.sub(r'https?:[^ ]*', '', text)
-    text = re.sub(r'mailto:[^ ]*', '', text)
-    # remove or replace weird characters
-    replacements = {
+class Normalizer(object):
+    """
+    compiled form of the clean_text rules
+
+    produces exactly the output of applying the rules one after another:
+    the literal replacements run through a single alternation, the regex
+    rules are compiled once, and each distinct all-caps token is looked up
+    in the dictionary once, so the cost stays linear on book-length input
+    """
+    # literal replacements; "…" becomes "." before ".com" etc. are replaced,
+    # so "…com" is listed explicitly to keep that interaction
+    REPLACEMENTS = {
         "‘": "'",
         "’": "'",
         "“": '"',
         "”": '"',
+        "…com": " dot com",
+        "…org": " dot org",
+        "…net": " dot net",
         "…": '.',
         '\u00a0': ' ',  # non-breaking space
         "@": " at ",
@@ -303,34 +349,103 @@ def clean_text(text):
         ".org": " dot org",
         ".net": " dot net"
     }
-    for x, y in replacements.items():
-        text = text.replace(x, y)
-    text = unidecode(text.strip())
-    text = anyascii(text)
-    # clean up whitespace and punctuation
-    replacements = [
-        (r'[^A-Za-z0-9 \n\-/()_.,%!"\'?;:]+', ' '),
-        (r'([,.!"\':?])\1+', r'\1'),
-        (r'^[^A-Za-z]*$', '\n'),
-        (r'\n\n+', '\n\n'),
-        (r' +\. +', '. '),
-        (r' +', ' '),
-        (r'([A-Za-z])([,!":?])+([A-Za-z])', r'\1\2 \3'),
-        (r' +\.', '.'),
-        (r'^.{,8}$', '')
-    ]
-    for (x, y) in replacements:
-        text = re.sub(pattern=x, repl=y, string=text, flags=re.M)
-    # for any all caps word longer than 4 characters, convert to lowercase if it is an English word
-    all_caps_words = re.findall(r'[A-Z]{4,15}', text)
-    try:
-        for word in all_caps_words:
-            if DICTIONARY.check(word):
-                replacement = word.lower()
-                text = text.replace(word, replacement)
-    except Exception:  # pylint: disable=broad-except
-        pass
-    return text
+
+    def __init__(self, dictionary=None):
+        self.dictionary = dictionary
+        self.links = re.compile(r'(?:https?|mailto):[^ ]*')
+        self.literals = re.compile(
+            '|'.join(re.escape(x) for x in sorted(self.REPLACEMENTS, key=len, reverse=True)))
+        self.symbols = re.compile(r'[^A-Za-z0-9 \n\-/()_.,%!"\'?;:]+')
+        self.repeats = re.compile(r'([,.!"\':?])\1+')
+        self.empty_lines = re.compile(r'^[^A-Za-z]*$', re.M)
+        self.blank_lines = re.compile(r'\n\n+')
+        self.spaced_period = re.compile(r' +\. +')
+        # replacing a single space with a space is a no-op, so only runs are visited
+        self.spaces = re.compile(r' {2,}')
+        self.punctuation = re.compile(r'([A-Za-z])([,!":?])+([A-Za-z])')
+        self.space_period = re.compile(r' +\.')
+        self.short_lines = re.compile(r'^.{,8}$', re.M)
+        self.capitals = re.compile(r'([A-Z]{4,})')
+
+    def lowercase_words(self, text):
+        """
+        lowercase all-caps English words of 4 to 15 letters
+
+        equivalent to calling text.replace(word, word.lower()) for every word
+        re.findall(r'[A-Z]{4,15}', text) returns that is in the dictionary, in
+        order; such a word can only occur inside a run of capitals, so each
+        distinct run is rewritten once
+        """
+        parts = self.capitals.split(text)
+        runs = parts[1::2]
+        if not runs or not self.dictionary:
+            return text
+        order = {}
+        for run in dict.fromkeys(runs):
+            for start in range(0, len(run), 15):
+                word = run[start:start+15]
+                if len(word) >= 4 and word not in order:
+                    order[word] = len(order)
+        accepted = {}
+        try:
+            for word, rank in order.items():
+                if self.dictionary.check(word):
+                    accepted[word] = rank
+        except Exception:  # pylint: disable=broad-except
+            pass
+        if not accepted:
+            return text
+        rewritten = {}
+        for run in set(runs):
+            words = {run[i:j] for i in range(len(run))
+                     for j in range(i+4, min(i+15, len(run))+1)
+                     if run[i:j] in accepted}
+            result = run
+            for word in sorted(words, key=accepted.get):
+                result = result.replace(word, word.lower())
+            rewritten[run] = result
+        parts[1::2] = [rewritten[x] for x in runs]
+        return ''.join(parts)
+
+    def normalize(self, text):
+        """remove as much non-speakable text as possible"""
+        if not isinstance(text, str):
+            text = text.decode('utf-8', 'ignore')
+        text = unescape(text)
+        # remove obvious hyperlinks
+        text = self.links.sub('', text)
+        # remove or replace weird characters
+        text = self.literals.sub(lambda x: self.REPLACEMENTS[x.group()], text)
+        text = unidecode(text.strip())
+        if not text.isascii():
+            text = anyascii(text)
+        # clean up whitespace and punctuation
+        text = self.symbols.sub(' ', text)
+        text = self.repeats.sub(r'\1', text)
+        text = self.empty_lines.sub('\n', text)
+        text = self.blank_lines.sub('\n\n', text)
+        text = self.spaced_period.sub('. ', text)
+        text = self.spaces.sub(' ', text)
+        text = self.punctuation.sub(r'\1\2 \3', text)
+        text = self.space_period.sub('.', text)
+        text = self.short_lines.sub('', text)
+        # for any all caps word longer than 4 characters, convert to lowercase if it is an English word
+        return self.lowercase_words(text)
+
+
+def get_normalizer():
+    """build the shared Normalizer, with its English dictionary, on first use"""
+    global NORMALIZER  # pylint: disable=global-statement
+    if NORMALIZER is None:
+        import enchant  # pylint: disable=import-outside-toplevel
+        NORMALIZER = Normalizer(enchant.Dict("en_US"))
+    return NORMALIZER
+
+
+@timed('clean_text')
+def clean_text(text):
+    """remove as much non-speakable text as possible"""
+    return get_normalizer().normalize(text)
 
 
 # If Windows getch() available, use that.  If not, use a
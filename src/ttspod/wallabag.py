@@ -7,6 +7,7 @@ except ImportError:
     pass
 
 try:
+    from collections.abc import Iterator
     from html2text import HTML2Text
     from urllib.parse import urljoin as j
     import json
@@ -43,8 +44,12 @@ class Wallabag(object):
         self.log.write(f'wallabag token: {token}')
         self.access_token = token['access_token']
 
-    def get_items(self, tag="audio") -> list[tuple[str, str, str]]:
-        """retrieve URLs and content from Wallabag repository"""
+    def get_items(self, tag="audio") -> Iterator[tuple[str, str, str]]:
+        """
+        retrieve URLs and content from Wallabag repository
+
+        entries are converted to text lazily as they are consumed
+        """
         entries_url = j(
             self.url, 'api/entries.json?'
             f'tags={tag}&sort=created&order=asc&page=1&perPage=500&since=0&detail=full')
@@ -56,11 +61,8 @@ class Wallabag(object):
         h = HTML2Text()
         h.ignore_links = True
         h.ignore_images = True
-        all_entries = []
         for entry in entries:
             title = entry['title']
             text = h.handle(entry['content'])
             url = h.handle(entry['url'])
-            this_entry = (title, text, url)
-            all_entries.append(this_entry)
-        return all_entries
+            yield (title, text, url)
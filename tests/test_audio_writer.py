@@ -0,0 +1,54 @@
+"""shortening pauses in streamed audio"""
+# standard modules
+from os import path
+import sys
+
+import numpy as np
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path[:0] = [path.join(ROOT, 'src', 'ttspod'), path.join(ROOT, 'src', 'ttspod', 'speech')]
+
+# TTSPod modules
+# pylint: disable=wrong-import-position
+from audio_writer import SilenceSqueezer, squeeze_silence
+# pylint: enable=wrong-import-position
+
+RATE = 1000
+
+
+def tone(seconds):
+    """a loud stretch of audio"""
+    return np.full(int(seconds * RATE), 0.5, dtype=np.float32)
+
+
+def quiet(seconds):
+    """a silent stretch of audio"""
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def stream(chunks):
+    """squeeze chunks one at a time and join the output"""
+    squeezer = SilenceSqueezer(RATE)
+    return np.concatenate([squeezer.feed(x) for x in chunks] + [squeezer.flush()])
+
+
+def test_pause_across_chunk_join():
+    """a pause split between two chunks is shortened like one pause"""
+    chunks = [np.concatenate((tone(1), quiet(0.8))), np.concatenate((quiet(0.8), tone(1)))]
+    whole = squeeze_silence(np.concatenate(chunks), RATE)
+    assert len(whole) == 3 * RATE
+    assert np.array_equal(stream(chunks), whole)
+
+
+def test_matches_whole_waveform():
+    """streaming gives the same result as squeezing the joined waveform"""
+    pieces = [quiet(1.5), tone(0.3), quiet(0.4), quiet(2.2), tone(0.7), quiet(0.3),
+              tone(0.2), quiet(0.95), quiet(0.9), quiet(0.003), tone(0.05), quiet(1.7)]
+    for split in ([1, 3, 5], [2, 4, 7, 8, 9, 10], list(range(1, len(pieces)))):
+        chunks = [np.concatenate(pieces[a:b]) for (a, b) in zip([0] + split, split + [None])]
+        assert np.array_equal(stream(chunks), squeeze_silence(np.concatenate(pieces), RATE)), split
+
+
+def test_silent_stream():
+    """a stream that never makes a sound comes out empty"""
+    assert not len(stream([quiet(2), quiet(3)]))
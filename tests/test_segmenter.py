@@ -0,0 +1,37 @@
+"""rule-based sentence segmenter"""
+# standard modules
+from os import path
+import sys
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), 'src', 'ttspod'))
+
+# TTSPod modules
+# pylint: disable=wrong-import-position
+from segmenter import split_sentences
+# pylint: enable=wrong-import-position
+
+
+def test_ordinary_words_end_sentences():
+    """words that double as abbreviations still end sentences"""
+    for text in ['I said no. Then I left.', 'He bought some art. Then he left.',
+                 'The cat sat. Then it slept.', 'We lay in the sun. Then it rained.',
+                 'She played the op. Then she bowed.', 'It was a long sec. Then it ended.']:
+        assert len(split_sentences(text)) == 2, text
+
+
+def test_numbered_abbreviations():
+    """No., Fig. and Vol. before a number do not end a sentence"""
+    assert split_sentences('See Fig. 3 for details. It is clear.') == \
+        ['See Fig. 3 for details.', 'It is clear.']
+    assert split_sentences('He wore No. 7 all season. Fans loved it.') == \
+        ['He wore No. 7 all season.', 'Fans loved it.']
+    assert len(split_sentences('Read Vol. 2 first. Then Vol. 3.')) == 2
+
+
+def test_titles_and_names():
+    """titles, initials and et al. do not end a sentence"""
+    assert split_sentences('Gen. Grant spoke to Mr. Lincoln. They agreed.') == \
+        ['Gen. Grant spoke to Mr. Lincoln.', 'They agreed.']
+    assert split_sentences('Smith et al. Found the same. It held.') == \
+        ['Smith et al. Found the same.', 'It held.']
+    assert len(split_sentences('J. R. R. Tolkien wrote it. It sold well.')) == 2